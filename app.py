@@ -1,8 +1,14 @@
+import os
 import streamlit as st
-from supabase import create_client
+from collections import deque
 from decimal import Decimal
 import pandas as pd
 import utils
+import settlements
+import splits
+import importer
+import export
+import instrumentation
 
 # --- Setup page ---
 st.set_page_config(page_title='🏢 Splitwise — Office Edition', page_icon='💸', layout='wide')
@@ -17,6 +23,10 @@ st.session_state.mode = st.sidebar.radio(
 )
 is_login_mode = st.session_state.mode == "Login Mode"
 
+# --- Diagnostics (per-rerun query/stage profiler) ---
+diagnostics_on = st.sidebar.checkbox("🩺 Diagnostics", key="diagnostics_on")
+instrumentation.begin_rerun(diagnostics_on, mode=st.session_state.mode)
+
 # --- Login state ---
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
@@ -47,7 +57,25 @@ if is_login_mode and st.session_state.logged_in:
     if not SUPABASE_URL or not SUPABASE_ANON_KEY:
         st.error('Please add SUPABASE_URL and SUPABASE_ANON_KEY to Streamlit secrets.')
         st.stop()
-    supabase = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+    supabase = instrumentation.instrument(utils.get_client(SUPABASE_URL, SUPABASE_ANON_KEY))
+
+# --- Group (team) selection: every tab below reads and writes only this group ---
+groups_df = utils.fetch_groups(supabase)
+group_names = dict(zip(groups_df['id'].tolist(), groups_df['name'].tolist())) or {utils.DEFAULT_GROUP_ID: 'Default'}
+if "pending_group_id" in st.session_state:
+    # Set by "Create group" below; applied before the selector is drawn
+    st.session_state.group_id = st.session_state.pop("pending_group_id")
+group_id = st.sidebar.selectbox(
+    "👥 Group", options=list(group_names), format_func=lambda gid: group_names[gid], key="group_id"
+)
+instrumentation.annotate("group_id", group_id)
+with st.sidebar.expander("➕ New group"):
+    new_group = st.text_input("Group name", key="new_group_name")
+    if st.button("Create group", key="create_group"):
+        g = utils.create_group(supabase, new_group)
+        if g:
+            st.session_state.pending_group_id = g['id']
+            st.rerun()
 
 # --- Header ---
 st.markdown('<div style="font-size:2.2rem; font-weight:bold; color:#4CAF50;">💸 Splitwise — Office Edition</div>', unsafe_allow_html=True)
@@ -60,11 +88,31 @@ if is_login_mode and st.session_state.logged_in:
         if st.button("🔓 Logout"):
             st.session_state.logged_in = False
             st.rerun()
-            
+
+        st.markdown("---")
+        st.markdown("### 📌 Balance Checkpoint")
+        cp1, cp2 = st.columns(2)
+        if cp1.button("Create", key="checkpoint_create"):
+            try:
+                as_of = utils.create_balance_checkpoint(supabase, group_id)
+                st.success(f"✅ Checkpoint saved up to expense #{as_of}")
+            except Exception as e:
+                st.error(f"❌ Could not create checkpoint: {e}")
+        if cp2.button("Verify", key="checkpoint_verify"):
+            try:
+                report = utils.verify_checkpoint(supabase, group_id)
+                if report['ok']:
+                    st.success(f"✅ Checkpoint #{report['as_of_expense_id']} + tail matches a full replay")
+                else:
+                    st.error(f"❌ {len(report['mismatches'])} member(s) differ from a full replay")
+                    st.dataframe(report['mismatches'], hide_index=True)
+            except Exception as e:
+                st.error(f"❌ Could not verify checkpoint: {e}")
+
         st.markdown("---")
         st.markdown("### ⚠️ Danger Zone")
-        admin_pass = st.text_input("Admin password to flush DB", type="password", key="flush_pass")
-        if st.button("🗑️ Flush Entire Database"):
+        admin_pass = st.text_input("Admin password to flush group", type="password", key="flush_pass")
+        if st.button(f"🗑️ Flush group '{group_names[group_id]}'"):
             if admin_pass == st.secrets['admin_pass']:  # Replace with your real admin password check
                 st.session_state.show_flush_confirm = True
             else:
@@ -73,23 +121,23 @@ if is_login_mode and st.session_state.logged_in:
         st.markdown("</div>", unsafe_allow_html=True)
 
     if st.session_state.get("show_flush_confirm", False):
-        st.warning("This will permanently DELETE ALL data from the database! Are you sure?")
+        st.warning(f"This will permanently DELETE ALL data of group '{group_names[group_id]}'! Are you sure?")
         col1, col2 = st.columns(2)
         if col1.button("Yes, Delete Everything"):
             try:
-                supabase.table("transactions").delete().neq('id', 0).execute()
-                supabase.table("expenses").delete().neq('id', 0).execute()
-                supabase.table("members").delete().neq('id', 0).execute()
-                st.success("✅ Database flushed successfully.")
+                utils.flush_group(supabase, group_id)
+                st.success("✅ Group flushed successfully.")
                 st.session_state.show_flush_confirm = False
                 st.rerun()
             except Exception as e:
-                st.error(f"❌ Error flushing DB: {e}")
+                st.error(f"❌ Error flushing group: {e}")
         if col2.button("Cancel"):
             st.session_state.show_flush_confirm = False
 
 # --- Tabs ---
-tab1, tab2, tab3, tab4 = st.tabs(["👥 Members", "➕ Add Expense", "📜 History", "📊 Balances"])
+tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(
+    ["👥 Members", "➕ Add Expense", "📜 History", "📊 Balances", "📥 Import", "📈 Analytics"]
+)
 
 # --- MEMBERS ---
 with tab1:
@@ -101,85 +149,167 @@ with tab1:
             if not name.strip():
                 st.error('⚠️ Name required')
             else:
-                u = utils.create_member(supabase, name.strip())
+                u = utils.create_member(supabase, name.strip(), group_id)
                 if u:
                     st.success(f"✅ Added {u['name']}")
-    members_df = utils.fetch_members(supabase)
+    members_df = utils.fetch_members(supabase, group_id)
     st.dataframe(members_df, use_container_width=True)
 
 # --- ADD EXPENSE ---
 with tab2:
     st.markdown('<h3>➕ Add New Expense</h3>', unsafe_allow_html=True)
-    members_df = utils.fetch_members(supabase)
+    members_df = utils.fetch_members(supabase, group_id)
     if members_df.empty:
         st.info('ℹ️ Add some members first.')
     else:
+        # Participants and split mode sit outside the form so the per-participant
+        # inputs below follow them as they change
+        participants = st.multiselect('Participants', options=members_df['name'].tolist(), default=members_df['name'].tolist())
+        split_labels = {'equal': 'Equally', 'shares': 'By shares', 'percent': 'By percentage', 'exact': 'Exact amounts'}
+        split_mode = st.radio('Split', options=list(split_labels), format_func=split_labels.get, horizontal=True)
         with st.form('expense_form', clear_on_submit=True):
             col1, col2 = st.columns(2)
             title = col1.text_input('Title (e.g., Lunch with team)')
             amount = col2.number_input('Total amount (₹)', min_value=0.0, format='%.2f')
             payer = st.selectbox('Payer', options=members_df['name'].tolist())
-            participants = st.multiselect('Participants', options=members_df['name'].tolist(), default=members_df['name'].tolist())
+            split_values = None
+            if split_mode != 'equal' and participants:
+                value_label = {'shares': 'Shares', 'percent': '%', 'exact': '₹'}[split_mode]
+                if split_mode == 'percent':
+                    # even percentages that already add up to 100
+                    defaults = (splits.split(10_000, len(participants)) / 100).tolist()
+                else:
+                    defaults = [1.0 if split_mode == 'shares' else 0.0] * len(participants)
+                value_cols = st.columns(min(len(participants), 4))
+                split_values = [
+                    value_cols[i % len(value_cols)].number_input(
+                        f'{p} ({value_label})', min_value=0.0, value=defaults[i], format='%.2f', key=f'split_{split_mode}_{p}'
+                    )
+                    for i, p in enumerate(participants)
+                ]
             description = st.text_area('Description (optional)')
             submit = st.form_submit_button('💾 Create Expense')
             if submit:
-                if is_login_mode:
-                    name2id = {r['name']: r['id'] for r in (supabase.table('members').select('*').execute().data or [])}
-                else:
-                    name2id = {r['name']: r['id'] for r in st.session_state.guest_members}
+                name2id = dict(zip(members_df['name'].tolist(), members_df['id'].tolist()))
                 payer_id = name2id[payer]
                 participant_ids = [name2id[p] for p in participants] or [payer_id]
-                expense_id = utils.create_expense_with_transactions(
-                    supabase,
-                    payer_id=payer_id,
-                    amount=Decimal(str(amount)),
-                    title=title or '',
-                    description=description or '',
-                    participant_ids=participant_ids
-                )
-                st.success('✅ Expense created')
+                try:
+                    expense_id = utils.create_expense_with_transactions(
+                        supabase,
+                        payer_id=payer_id,
+                        amount=Decimal(str(amount)),
+                        title=title or '',
+                        description=description or '',
+                        participant_ids=participant_ids,
+                        group_id=group_id,
+                        split_mode=split_mode if participants else 'equal',
+                        split_values=split_values,
+                    )
+                    st.success('✅ Expense created')
+                except ValueError as e:
+                    st.error(f"❌ {e}")
 
 # --- HISTORY (grouped tables + delete per expense) ---
 with tab3:
     st.markdown('<h3>📜 Expense History</h3>', unsafe_allow_html=True)
-    hist_df = utils.fetch_history(supabase)
+    hist_members = utils.fetch_members(supabase, group_id)
+    member_names = hist_members['name'].tolist() if not hist_members.empty else []
+    hist_name2id = dict(zip(member_names, hist_members['id'].tolist())) if member_names else {}
 
-    if hist_df.empty:
+    if not member_names:
         st.info('ℹ️ No expenses yet.')
     else:
-        unique_titles = hist_df['title'].unique()
-        for title in unique_titles:
-            st.markdown(f"### {title}")
-            sub_df = hist_df[hist_df['title'] == title].copy()
-            display_df = sub_df.drop(columns=['expense_id'])  
-            expense_id = sub_df['expense_id'].iloc[0]
-            delete_button_key = f"del_expense_{expense_id}"
-
-            st.dataframe(display_df, use_container_width=True)
-
-            if st.button(f"🗑️ Delete all entries for '{title}'", key=delete_button_key):
-                if is_login_mode:
-                    try:
-                        supabase.table("transactions").delete().eq('expense_id', expense_id).execute()
-                        supabase.table("expenses").delete().eq('id', expense_id).execute()
-                        st.success(f"Deleted expense '{title}' and related transactions.")
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Failed to delete: {e}")
-                else:
-                    st.session_state.guest_transactions = [
-                        t for t in st.session_state.guest_transactions if t['expense_id'] != expense_id
-                    ]
-                    st.session_state.guest_expenses = [
-                        e for e in st.session_state.guest_expenses if e['id'] != expense_id
-                    ]
-                    st.success(f"Deleted expense '{title}' and related transactions (guest mode).")
+        with st.expander('⬇️ Export history'):
+            ex1, ex2, ex3 = st.columns(3)
+            ex_range = ex1.date_input('Date range', value=(), key='export_range')
+            ex_member = ex2.selectbox('Member', options=['All'] + sorted(member_names), key='export_member')
+            ex_fmt = ex3.selectbox('Format', options=['csv', 'parquet'], key='export_fmt')
+            if st.button('Prepare export', key='export_prepare'):
+                try:
+                    path = export.export_history_tempfile(
+                        supabase, ex_fmt,
+                        start=ex_range[0] if len(ex_range) > 0 else None,
+                        end=ex_range[1] if len(ex_range) > 1 else None,
+                        member=None if ex_member == 'All' else ex_member,
+                        group_id=group_id,
+                    )
+                    with open(path, 'rb') as f:
+                        st.download_button(
+                            f'Download {ex_fmt.upper()}', f, file_name=f'splitwise_history.{ex_fmt}',
+                            mime='text/csv' if ex_fmt == 'csv' else 'application/octet-stream',
+                        )
+                    os.remove(path)
+                except ImportError as e:
+                    st.error(f"❌ {e}")
+
+        # Filters and paging run on the server; only the visible page is fetched and rendered
+        f1, f2, f3, f4 = st.columns(4)
+        h_search = f1.text_input('Search title', key='hist_search')
+        h_range = f2.date_input('Date range', value=(), key='hist_range')
+        h_payer = f3.selectbox('Payer', options=['All'] + sorted(member_names), key='hist_payer')
+        h_member = f4.selectbox('Member', options=['All'] + sorted(member_names), key='hist_member')
+        h_filters = dict(
+            start=h_range[0] if len(h_range) > 0 else None,
+            end=h_range[1] if len(h_range) > 1 else None,
+            payer_id=None if h_payer == 'All' else hist_name2id[h_payer],
+            member_id=None if h_member == 'All' else hist_name2id[h_member],
+            search=h_search.strip() or None,
+        )
+        h_state = {**h_filters, 'group_id': group_id}
+        # A new filter starts again from the first page
+        if st.session_state.get('hist_filters') != h_state:
+            st.session_state.hist_filters = h_state
+            st.session_state.hist_page = 1
+
+        page_df, total = utils.fetch_history_page(
+            supabase, st.session_state.get('hist_page', 1) - 1, utils.HISTORY_PAGE_SIZE, **h_state
+        )
+        pages = max(1, -(-total // utils.HISTORY_PAGE_SIZE))
+        if st.session_state.hist_page > pages:
+            # Deletes can shrink the result under the current page
+            st.session_state.hist_page = pages
+            page_df, total = utils.fetch_history_page(supabase, pages - 1, utils.HISTORY_PAGE_SIZE, **h_state)
+        if total == 0:
+            filtered = any(v is not None for v in h_filters.values())
+            st.info('ℹ️ No expenses match these filters.' if filtered else 'ℹ️ No expenses yet.')
+        else:
+            p1, p2 = st.columns([1, 3])
+            p1.number_input('Page', min_value=1, max_value=pages, step=1, key='hist_page')
+            p2.caption(f"{total} expense(s), page {st.session_state.hist_page} of {pages}")
+
+            # Bulk delete of expenses on this page, in one request
+            page_titles = page_df.drop_duplicates('expense_id').set_index('expense_id')['title'].to_dict()
+            b1, b2 = st.columns([4, 1])
+            to_delete = b1.multiselect(
+                'Select expenses to delete', options=list(page_titles),
+                format_func=lambda eid: f"#{eid} {page_titles[eid]}", key=f"bulk_delete_{group_id}",
+            )
+            if b2.button("🗑️ Delete selected", disabled=not to_delete, key="bulk_delete_button"):
+                try:
+                    deleted = utils.delete_expenses(supabase, [int(eid) for eid in to_delete], group_id)
+                    st.success(f"Deleted {len(deleted)} expense(s) and related transactions.")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Failed to delete: {e}")
+
+        for expense_id, group in page_df.groupby('expense_id', sort=False):
+            first = group.iloc[0]
+            st.markdown(f"### {first['title']}")
+            st.caption(f"#{expense_id} · {str(first['date'])[:10]} · paid by {first['payer']} · ₹{first['total_amount']}")
+            st.dataframe(group.drop(columns=['expense_id']), use_container_width=True, hide_index=True)
+
+            if st.button(f"🗑️ Delete expense #{expense_id}", key=f"del_expense_{expense_id}"):
+                try:
+                    utils.delete_expense(supabase, int(expense_id), group_id)
+                    st.success(f"Deleted expense '{first['title']}' and related transactions.")
                     st.rerun()
+                except Exception as e:
+                    st.error(f"Failed to delete: {e}")
 
 # --- BALANCES with PAID toggle buttons ---
 with tab4:
     st.markdown('<h3>📊 Balances & Settlements</h3>', unsafe_allow_html=True)
-    bal_df = utils.compute_balances(supabase)
+    bal_df = utils.compute_balances(supabase, group_id=group_id)
 
     if bal_df.empty:
         st.info('ℹ️ No balances yet. Add members and expenses first.')
@@ -189,33 +319,40 @@ with tab4:
         bal_table['Balance (₹)'] = bal_table['balance'].apply(lambda x: f"₹{x:.2f}")
         st.dataframe(bal_table[['name', 'Balance (₹)']], use_container_width=True)
 
+        # Drill-down: only the selected member's lines are read, with a running balance
+        with st.expander('🔎 Member statement'):
+            sm1, sm2 = st.columns(2)
+            stmt_name = sm1.selectbox('Member', options=bal_df['name'].tolist(), key='statement_member')
+            stmt_range = sm2.date_input('Date range', value=(), key='statement_range')
+            stmt_id = int(bal_df.loc[bal_df['name'] == stmt_name, 'member_id'].iloc[0])
+            stmt_df = utils.fetch_member_statement(
+                supabase, stmt_id,
+                start=stmt_range[0] if len(stmt_range) > 0 else None,
+                end=stmt_range[1] if len(stmt_range) > 1 else None,
+                group_id=group_id,
+            )
+            if stmt_df.empty:
+                st.info(f'ℹ️ No expenses for {stmt_name} in this range.')
+            else:
+                opening = stmt_df['balance'].iloc[0] - stmt_df['paid'].iloc[0] + stmt_df['owed'].iloc[0]
+                st.caption(
+                    f"Opening ₹{opening:.2f} · paid ₹{stmt_df['paid'].sum():.2f} · "
+                    f"owed ₹{stmt_df['owed'].sum():.2f} · closing ₹{stmt_df['balance'].iloc[-1]:.2f}"
+                )
+                st.dataframe(stmt_df.drop(columns=['expense_id']), use_container_width=True, hide_index=True)
+
         st.markdown("### 💱 Suggested Settlements")
-        pos = bal_df[bal_df.balance > 0.01][['name','balance']].to_dict('records')
-        neg = bal_df[bal_df.balance < -0.01][['name','balance']].to_dict('records')
+        with instrumentation.stage('settlements'):
+            transfers = settlements.suggest_settlements(bal_df)
 
-        if not pos or not neg:
+        if not transfers:
             st.info("✅ All balances are settled!")
         else:
-            pos = sorted(pos, key=lambda x: x['balance'], reverse=True)
-            neg = sorted(neg, key=lambda x: x['balance'])
-
-            i, j = 0, 0
-            transfers = []
-            while i < len(pos) and j < len(neg):
-                p = pos[i]
-                n = neg[j]
-                amt = min(p['balance'], -n['balance'])
-                transfers.append({'From': n['name'], 'To': p['name'], 'Amount (₹)': round(amt, 2)})
-                p['balance'] -= amt
-                n['balance'] += amt
-                if abs(p['balance']) < 1e-9: i += 1
-                if abs(n['balance']) < 1e-9: j += 1
-
             if 'paid_settlements' not in st.session_state:
                 st.session_state.paid_settlements = set()
 
             for idx, row in enumerate(transfers):
-                key = f"settlement_paid_{idx}"
+                key = f"settlement_paid_{group_id}_{idx}"
                 paid = key in st.session_state.paid_settlements
 
                 col1, col2 = st.columns([1, 6])
@@ -229,6 +366,91 @@ with tab4:
                 with col2:
                     style = "text-decoration: line-through; color: gray;" if paid else ""
                     st.markdown(
-                        f"<div style='{style}'>From: <b>{row['From']}</b> ➔ To: <b>{row['To']}</b> — Amount: <b>₹{row['Amount (₹)']}</b></div>",
+                        f"<div style='{style}'>From: <b>{row['from']}</b> ➔ To: <b>{row['to']}</b> — Amount: <b>₹{row['amount_cents'] / 100:.2f}</b></div>",
                         unsafe_allow_html=True
                     )
+
+# --- IMPORT (bulk CSV / Excel) ---
+with tab5:
+    st.markdown('<h3>📥 Import Expenses</h3>', unsafe_allow_html=True)
+    st.caption(
+        "Columns: title, amount, payer, participants (names separated by ';', empty means the payer), "
+        "and optionally description and date. Unknown names are added as members."
+    )
+    upload = st.file_uploader('CSV or Excel file', type=['csv', 'xlsx'])
+    if upload is not None and st.button('📥 Import expenses'):
+        bar = st.progress(0.0, text='Importing…')
+        try:
+            report = importer.import_expenses(
+                supabase, upload, group_id=group_id,
+                progress=lambda done, total: bar.progress(done / max(total, 1), text=f'Imported {done}/{total} rows'),
+            )
+        except (ValueError, ImportError) as e:
+            st.error(f"❌ Import failed: {e}")
+        else:
+            st.success(f"✅ Created {len(report['created'])} expenses from {report['rows']} rows.")
+            if not report['errors'].empty:
+                st.warning(f"⚠️ {len(report['errors'])} rows were skipped.")
+                st.dataframe(report['errors'], use_container_width=True)
+                st.download_button(
+                    'Download error report', report['errors'].to_csv(index=False),
+                    file_name='import_errors.csv', mime='text/csv',
+                )
+
+# --- ANALYTICS (reads only the pre-aggregated rollups, never the history) ---
+with tab6:
+    st.markdown('<h3>📈 Spending Analytics</h3>', unsafe_allow_html=True)
+    roll = utils.fetch_rollups(supabase, group_id)
+    by_member, by_title = roll['members'], roll['titles']
+    if by_member.empty:
+        st.info('ℹ️ No expenses yet.')
+    else:
+        months = sorted(by_member['month'].unique().tolist())
+        a_month = st.selectbox('Month', options=['All'] + months[::-1], key='analytics_month')
+        if a_month != 'All':
+            by_member = by_member[by_member['month'] == a_month]
+            by_title = by_title[by_title['month'] == a_month]
+
+        st.markdown("### Monthly spend per member")
+        st.caption("Each member's share of the group's expenses (what they owe), by month.")
+        st.bar_chart(by_member.pivot_table(index='month', columns='name', values='owed', aggfunc='sum', fill_value=0, observed=True))
+
+        a1, a2 = st.columns(2)
+        with a1:
+            st.markdown("### Top payers")
+            payers = by_member.groupby('name', observed=True)[['paid', 'paid_count']].sum()
+            payers = payers[payers['paid_count'] > 0].sort_values('paid', ascending=False)
+            st.bar_chart(payers['paid'])
+        with a2:
+            st.markdown("### Spend by title")
+            titles = by_title.groupby('title')[['amount', 'expenses']].sum().sort_values('amount', ascending=False)
+            st.dataframe(
+                titles.rename(columns={'amount': 'Amount (₹)', 'expenses': 'Expenses'}),
+                use_container_width=True,
+            )
+
+# --- Diagnostics panel ---
+if diagnostics_on:
+    diag_history = st.session_state.setdefault("diagnostics_history", deque(maxlen=instrumentation.HISTORY_SIZE))
+    instrumentation.annotate("cache", utils.cache_stats())
+    if supabase is not None:
+        # Mirror watermarks (ids and newest expense created_at) and refresh counts
+        instrumentation.annotate("sync", utils.sync_stats(group_id))
+    profile = instrumentation.end_rerun(diag_history)
+    with st.sidebar.expander("🩺 Diagnostics", expanded=True):
+        summary = instrumentation.summarize(profile)
+        st.caption(
+            f"Rerun {summary['total_ms']} ms · {summary['calls']} Supabase calls · "
+            f"{summary['db_ms']} ms in DB · {summary['rows']} rows · {summary['bytes'] / 1024:.1f} KiB"
+        )
+        if profile['calls']:
+            st.dataframe(pd.DataFrame(profile['calls']), use_container_width=True)
+        if profile['stages']:
+            st.dataframe(pd.DataFrame(profile['stages']), use_container_width=True)
+        st.json(profile['meta'].get('cache', {}), expanded=False)
+        if 'sync' in profile['meta']:
+            st.json(profile['meta']['sync'], expanded=False)
+        st.download_button(
+            f"Export last {len(diag_history)} reruns (JSON)", instrumentation.export_json(diag_history),
+            file_name="diagnostics.json", mime="application/json",
+        )
@@ -0,0 +1,399 @@
+# In-process stand-in for supabase.Client, covering the PostgREST builder
+# calls made by utils/app plus the RPC functions in supabase_schema.sql.
+# Every execute() counts as one round trip, optionally sleeps for a simulated
+# network latency and JSON-roundtrips the payload like a real response.
+import bisect
+import json
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+# Child tables deleted with their parent (mirrors `on delete cascade`)
+CASCADES = {
+    'expenses': [('transactions', 'expense_id')],
+    'members': [('transactions', 'member_id')],
+}
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table_name = table
+        self.op = 'select'
+        self.payload = None
+        self.filters = []
+        self.order_by = []
+        self.limit_n = None
+        self.offset = 0
+        self.count = None
+        self.columns = None
+        self.after_id = None
+
+    # ---------- Operations ----------
+    def select(self, columns='*', count=None):
+        self.op = 'select'
+        self.count = count
+        # Embedded resources (`child!inner(cols)`) only act as filters here
+        columns = [c.strip() for c in columns.split(',') if '(' not in c]
+        self.columns = None if columns == ['*'] else columns
+        return self
+
+    def insert(self, rows):
+        self.op = 'insert'
+        self.payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def update(self, values):
+        self.op = 'update'
+        self.payload = values
+        return self
+
+    def delete(self):
+        self.op = 'delete'
+        return self
+
+    # ---------- Filters ----------
+    def _filter(self, column, pred):
+        if '.' in column:
+            return self._embedded_filter(*column.split('.', 1), pred)
+        self.filters.append(lambda row: row.get(column) is not None and pred(row.get(column)))
+        return self
+
+    def _embedded_filter(self, child, column, pred):
+        # `child.column` filter through an inner-joined embed: keep parents
+        # with at least one matching child row
+        fk = dict(CASCADES[self.table_name])[child]
+        parents = None
+
+        def has_child(row):
+            nonlocal parents
+            if parents is None:
+                parents = {c[fk] for c in self.client.tables[child] if c.get(column) is not None and pred(c[column])}
+            return row['id'] in parents
+        self.filters.append(has_child)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, lambda v: v == value)
+
+    def neq(self, column, value):
+        return self._filter(column, lambda v: v != value)
+
+    def gt(self, column, value):
+        if column == 'id':
+            # Rows are kept in id order, so keyset pages can bisect
+            self.after_id = value if self.after_id is None else max(self.after_id, value)
+            return self
+        return self._filter(column, lambda v: v > value)
+
+    def gte(self, column, value):
+        return self._filter(column, lambda v: v >= value)
+
+    def lt(self, column, value):
+        return self._filter(column, lambda v: v < value)
+
+    def lte(self, column, value):
+        return self._filter(column, lambda v: v <= value)
+
+    def in_(self, column, values):
+        values = set(values)
+        return self._filter(column, lambda v: v in values)
+
+    def ilike(self, column, pattern):
+        needle = pattern.strip('%').lower()
+        return self._filter(column, lambda v: needle in str(v).lower())
+
+    def or_(self, filters, reference_table=None):
+        # Only the `column.eq.value` and `column.is.null` clauses utils uses
+        clauses = []
+        for clause in filters.split(','):
+            column, op, value = clause.split('.', 2)
+            if op == 'is' and value == 'null':
+                clauses.append(lambda row, c=column: row.get(c) is None)
+            elif op == 'eq':
+                clauses.append(lambda row, c=column, v=value: str(row.get(c)) == v)
+            else:
+                raise NotImplementedError(clause)
+        self.filters.append(lambda row: any(f(row) for f in clauses))
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def range(self, start, end):
+        self.offset = start
+        self.limit_n = end - start + 1
+        return self
+
+    # ---------- Execution ----------
+    def _matches(self, stop=None):
+        # `stop` ends the scan early once enough rows in id order are found
+        rows = self.client.tables[self.table_name]
+        start = 0
+        if self.after_id is not None:
+            start = bisect.bisect_right(self.client._ids(self.table_name), self.after_id)
+        out = []
+        for i in range(start, len(rows)):
+            if all(f(rows[i]) for f in self.filters):
+                out.append(rows[i])
+                if stop is not None and len(out) >= stop:
+                    break
+        return out
+
+    def execute(self):
+        self.client.tables.setdefault(self.table_name, [])
+        if self.op == 'insert':
+            data = [self.client._insert(self.table_name, r) for r in self.payload]
+            count = None
+        elif self.op == 'delete':
+            data = self._matches()
+            self.client._delete(self.table_name, data)
+            count = None
+        elif self.op == 'update':
+            data = self._matches()
+            for r in data:
+                r.update(self.payload)
+            count = None
+        else:
+            id_ordered = self.order_by in ([], [('id', False)])
+            stop = self.offset + self.limit_n if id_ordered and self.limit_n is not None and not self.count else None
+            data = self._matches(stop)
+            for column, desc in reversed(self.order_by):
+                data.sort(key=lambda r: r.get(column), reverse=desc)
+            count = len(data) if self.count else None
+            end = None if self.limit_n is None else self.offset + self.limit_n
+            data = data[self.offset:end]
+            if self.columns:
+                data = [{c: r.get(c) for c in self.columns} for r in data]
+        return self.client._respond(self.table_name, self.op, data, count)
+
+class FakeRPC:
+    def __init__(self, client, fn, params):
+        self.client = client
+        self.fn = fn
+        self.params = params or {}
+
+    def execute(self):
+        handler = self.client.functions[self.fn]
+        return self.client._respond(f'rpc:{self.fn}', 'rpc', handler(self.client, **self.params))
+
+class FakeClient:
+    def __init__(self, tables=None, latency: float = 0.0, serialize: bool = True, functions=None):
+        self.tables = defaultdict(list, {k: list(v) for k, v in (tables or {}).items()})
+        self.latency = latency
+        self.serialize = serialize
+        self.functions = {**DEFAULT_FUNCTIONS, **(functions or {})}
+        self.round_trips = 0
+        self.calls = []
+        self._id_index = {}
+        self._next_ids = {name: max((r['id'] for r in rows), default=0) + 1 for name, rows in self.tables.items()}
+        # Rollup rows by key and expense id -> (group_id, month), for the
+        # schema's rollup triggers; existing rows are backfilled like
+        # rebuild_spending_rollups()
+        self._rollup_rows = {}
+        self._expense_months = {}
+        for e in self.tables['expenses']:
+            self._rollup('expenses', e, 1)
+        for t in self.tables['transactions']:
+            self._rollup('transactions', t, 1)
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, fn, params=None):
+        return FakeRPC(self, fn, params)
+
+    def reset_counters(self):
+        self.round_trips = 0
+        self.calls = []
+
+    def _ids(self, table):
+        ids = self._id_index.get(table)
+        if ids is None or len(ids) != len(self.tables[table]):
+            ids = self._id_index[table] = [r['id'] for r in self.tables[table]]
+        return ids
+
+    def _insert(self, table, row):
+        row = dict(row)
+        if 'id' not in row:
+            row['id'] = self._next_ids.get(table, 1)
+        self._next_ids[table] = max(self._next_ids.get(table, 1), row['id'] + 1)
+        self.tables[table].append(row)
+        if table in ('expenses', 'transactions'):
+            self._rollup(table, row, 1)
+        return row
+
+    def _delete(self, table, rows):
+        ids = {r['id'] for r in rows}
+        if table == 'expenses':
+            # before delete: the expense and the shares it still has
+            for t in self.tables['transactions']:
+                if t['expense_id'] in ids:
+                    self._rollup('transactions', t, -1)
+            for row in rows:
+                self._rollup('expenses', row, -1)
+                self._expense_months.pop(row['id'], None)
+            # drop_stale_snapshots(): checkpoints covering a deleted expense
+            stale = [
+                s for s in self.tables['balance_snapshots']
+                if any(s['group_id'] == row.get('group_id') and s['as_of_expense_id'] >= row['id'] for row in rows)
+            ]
+            if stale:
+                self._delete('balance_snapshots', stale)
+        elif table == 'transactions':
+            # after delete: shares of expenses that still exist
+            for row in rows:
+                self._rollup('transactions', row, -1)
+        self.tables[table] = [r for r in self.tables[table] if r['id'] not in ids]
+        self._id_index.pop(table, None)
+        # Same rows the schema's record_tombstone() trigger would write
+        for row in sorted(rows, key=lambda r: r['id']):
+            self._insert('ledger_tombstones', {'table_name': table, 'row_id': row['id'], 'group_id': row.get('group_id')})
+        for child, column in CASCADES.get(table, ()):
+            self._delete(child, [r for r in self.tables[child] if r.get(column) in ids])
+
+    def truncate(self, *tables):
+        # TRUNCATE: no row triggers, one tombstone per table without a group
+        for table in tables:
+            self.tables[table] = []
+            self._id_index.pop(table, None)
+            if table == 'expenses':
+                self._expense_months.clear()
+            self._insert('ledger_tombstones', {'table_name': table, 'row_id': None, 'group_id': None})
+
+    def _rollup(self, table, row, direction):
+        # Same bumps as the schema's rollup_expense()/rollup_transaction()
+        if table == 'expenses':
+            group_id, month = row.get('group_id'), str(row['created_at'])[:7] + '-01'
+            self._expense_months[row['id']] = (group_id, month)
+            amount = direction * Decimal(str(row['amount']))
+            self._bump('spending_rollups', (group_id, month, row['payer_id']), paid=amount, paid_count=direction)
+            self._bump('title_rollups', (group_id, month, row.get('title') or ''), amount=amount, expenses=direction)
+        elif row['expense_id'] in self._expense_months:
+            group_id, month = self._expense_months[row['expense_id']]
+            amount = direction * Decimal(str(row['amount']))
+            self._bump('spending_rollups', (group_id, month, row['member_id']), owed=amount, shared_count=direction)
+
+    def _bump(self, table, key, **deltas):
+        if table == 'spending_rollups':
+            keys, values, counts = ('group_id', 'month', 'member_id'), ('paid', 'owed'), ('paid_count', 'shared_count')
+        else:
+            keys, values, counts = ('group_id', 'month', 'title'), ('amount',), ('expenses',)
+        row = self._rollup_rows.get((table, key))
+        if row is None:
+            row = dict(zip(keys, key), **dict.fromkeys(values + counts, 0))
+            row = self._rollup_rows[(table, key)] = self._insert(table, row)
+        for column, delta in deltas.items():
+            row[column] = float(Decimal(str(row[column])) + delta) if column in values else row[column] + delta
+        if not any(row[c] for c in counts):
+            del self._rollup_rows[(table, key)]
+            self.tables[table].remove(row)
+            self._id_index.pop(table, None)
+
+    def _respond(self, target, op, data, count=None):
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+        body = json.dumps(data, default=str)
+        self.calls.append({'target': target, 'op': op, 'rows': len(data) if isinstance(data, list) else 1, 'bytes': len(body)})
+        return FakeResponse(json.loads(body) if self.serialize else data, count)
+
+# ---------- RPC functions from supabase_schema.sql ----------
+def _group_rows(client, table, group_id):
+    return [r for r in client.tables[table] if r.get('group_id') == group_id]
+
+def _replay(client, group_id):
+    balances = {m['id']: Decimal(0) for m in _group_rows(client, 'members', group_id)}
+    for e in _group_rows(client, 'expenses', group_id):
+        balances[e['payer_id']] += Decimal(str(e['amount']))
+    for t in _group_rows(client, 'transactions', group_id):
+        balances[t['member_id']] -= Decimal(str(t['amount']))
+    return balances
+
+def _get_member_balances(client, p_group_id=1):
+    balances = _replay(client, p_group_id)
+    names = {m['id']: m['name'] for m in _group_rows(client, 'members', p_group_id)}
+    return [{'member_id': mid, 'name': names[mid], 'balance': float(round(bal, 2))} for mid, bal in sorted(balances.items())]
+
+def _create_expenses(client, payload):
+    out = []
+    for item in payload:
+        group_id = item.get('group_id') or 1
+        expense = client._insert('expenses', {
+            'group_id': group_id,
+            'title': item['title'],
+            'payer_id': item['payer_id'],
+            'amount': item['amount'],
+            'description': item['description'],
+            'created_at': item.get('created_at') or time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime()),
+        })
+        for share in item['shares']:
+            client._insert('transactions', {'group_id': group_id, 'expense_id': expense['id'], 'member_id': share['member_id'], 'amount': share['amount']})
+        out.append({'expense_id': expense['id']})
+    return out
+
+def _create_balance_snapshot(client, p_group_id=1):
+    cutoff = max((e['id'] for e in _group_rows(client, 'expenses', p_group_id)), default=0)
+    balances = _replay(client, p_group_id)
+    client.tables['balance_snapshots'] = [
+        r for r in client.tables['balance_snapshots']
+        if not (r['group_id'] == p_group_id and r['as_of_expense_id'] == cutoff)
+    ]
+    client._id_index.pop('balance_snapshots', None)
+    for mid, bal in sorted(balances.items()):
+        client._insert('balance_snapshots', {
+            'group_id': p_group_id, 'as_of_expense_id': cutoff, 'member_id': mid, 'balance': float(bal),
+        })
+    return cutoff
+
+def _delete_expenses(client, p_group_id, p_expense_ids):
+    ids = set(p_expense_ids)
+    rows = [e for e in _group_rows(client, 'expenses', p_group_id) if e['id'] in ids]
+    client._delete('expenses', rows)
+    return [{'expense_id': e['id']} for e in sorted(rows, key=lambda r: r['id'])]
+
+def _flush_group(client, p_group_id=1):
+    for table in ('balance_snapshots', 'transactions', 'expenses', 'members'):
+        client._delete(table, _group_rows(client, table, p_group_id))
+    return None
+
+def _member_statement(client, p_group_id, p_member_id, p_start=None, p_end=None):
+    lines = {}
+    for e in _group_rows(client, 'expenses', p_group_id):
+        if e['payer_id'] == p_member_id:
+            lines[e['id']] = [Decimal(str(e['amount'])), Decimal(0)]
+    for t in _group_rows(client, 'transactions', p_group_id):
+        if t['member_id'] == p_member_id:
+            lines.setdefault(t['expense_id'], [Decimal(0), Decimal(0)])[1] += Decimal(str(t['amount']))
+    expenses = {e['id']: e for e in client.tables['expenses'] if e['id'] in lines}
+    out, running = [], Decimal(0)
+    for eid in sorted(lines, key=lambda eid: (expenses[eid]['created_at'], eid)):
+        e, (paid, owed) = expenses[eid], lines[eid]
+        if p_end is not None and e['created_at'] >= p_end:
+            continue
+        running += paid - owed
+        if p_start is not None and e['created_at'] < p_start:
+            continue
+        out.append({
+            'expense_id': eid, 'created_at': e['created_at'], 'title': e['title'], 'payer_id': e['payer_id'],
+            'paid': float(paid), 'owed': float(owed), 'running_balance': float(round(running, 2)),
+        })
+    return out
+
+DEFAULT_FUNCTIONS = {
+    'get_member_balances': _get_member_balances,
+    'create_expenses': _create_expenses,
+    'create_balance_snapshot': _create_balance_snapshot,
+    'delete_expenses': _delete_expenses,
+    'flush_group': _flush_group,
+    'member_statement': _member_statement,
+}
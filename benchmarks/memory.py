@@ -0,0 +1,58 @@
+# Memory footprint of the fetch_history DataFrame: plain column lists (what
+# pandas infers on its own, like the old pd.DataFrame(list_of_dicts)) versus
+# the compact dtypes utils builds.
+#   python -m benchmarks.memory --tier large
+import argparse
+import json
+
+import pandas as pd
+
+import utils
+from benchmarks.fake_supabase import FakeClient
+from benchmarks.run import TIERS
+from benchmarks.synthetic import generate_office
+
+def report(tier: str = 'large', seed: int = 0) -> dict:
+    members, expenses, participants = TIERS[tier]
+    client = FakeClient(generate_office(members, expenses, participants, seed))
+    utils._mirrors.clear()
+    utils.invalidate_cache()
+    tables = utils.fetch_tables(client)
+    cols = utils._history_columns(tables['members'], tables['expenses'], tables['transactions'])
+
+    before = pd.DataFrame(cols, columns=utils.HISTORY_COLUMNS)
+    after = utils.fetch_history(client)
+    before_bytes = before.memory_usage(deep=True, index=False)
+    after_bytes = after.memory_usage(deep=True, index=False)
+    columns = [
+        {
+            'column': c,
+            'dtype_before': str(before[c].dtype),
+            'dtype_after': str(after[c].dtype),
+            'kib_before': round(before_bytes[c] / 1024, 1),
+            'kib_after': round(after_bytes[c] / 1024, 1),
+        }
+        for c in utils.HISTORY_COLUMNS
+    ]
+    return {
+        'tier': tier,
+        'rows': len(after),
+        'kib_before': round(before_bytes.sum() / 1024, 1),
+        'kib_after': round(after_bytes.sum() / 1024, 1),
+        'ratio': round(after_bytes.sum() / max(before_bytes.sum(), 1), 3),
+        'columns': columns,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report fetch_history DataFrame memory before/after compact dtypes.')
+    parser.add_argument('--tier', choices=list(TIERS), default='large')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    result = report(args.tier, args.seed)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(pd.DataFrame(result['columns']).to_string(index=False))
+        print(f"\n{result['rows']} rows: {result['kib_before']} KiB -> {result['kib_after']} KiB (x{result['ratio']})")
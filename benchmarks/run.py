@@ -0,0 +1,146 @@
+# Benchmark the data layer against the in-process fake Supabase client.
+#   python -m benchmarks.run --out bench.json
+#   python -m benchmarks.run --tiers small medium --latency 20 --compare bench.json
+# Reports wall time, round trips and peak traced memory per function and size
+# tier. Results are JSON so runs from different commits can be compared.
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+import utils
+import settlements
+from benchmarks.fake_supabase import FakeClient
+from benchmarks.synthetic import generate_office
+
+# name -> (members, expenses, participants per expense)
+TIERS = {
+    'small': (10, 500, 4),
+    'medium': (50, 5_000, 5),
+    'large': (200, 25_000, 6),
+}
+
+def _cold(fn):
+    # Empty mirror and snapshot: a first load in a fresh process
+    def run(client):
+        utils._mirrors.clear()
+        utils.invalidate_cache()
+        return fn(client)
+    return run
+
+def _delta(fn):
+    # Warm mirror, expired snapshot: what a rerun after a write pays
+    def run(client):
+        utils.invalidate_cache()
+        return fn(client)
+    return run
+
+def _split_all(client):
+    for e in client.tables['expenses']:
+        utils._split_amount(Decimal(str(e['amount'])), [1, 2, 3, 4, 5])
+
+def _settle(client):
+    return settlements.suggest_settlements(utils.compute_balances(client))
+
+def _balances_replay(client):
+    return utils._compute_balances_local(
+        utils._get_members(client),
+        utils._iter_rows(client, 'expenses'),
+        utils._iter_rows(client, 'transactions'),
+    )
+
+# Each case runs against a freshly seeded client and an empty mirror. "warm"
+# cases prime the mirror and snapshot with one untimed call first.
+CASES = {
+    'fetch_history[cold]': (_cold(utils.fetch_history), False),
+    'fetch_history[delta]': (_delta(utils.fetch_history), True),
+    'fetch_history[warm]': (utils.fetch_history, True),
+    'compute_balances[rpc]': (lambda c: utils.compute_balances(c, source='rpc'), False),
+    'compute_balances[mirror]': (_delta(utils.compute_balances), True),
+    'compute_balances[replay]': (_cold(_balances_replay), False),
+    'split_amount[all expenses]': (_split_all, False),
+    'settlements[auto]': (_delta(_settle), True),
+}
+
+def _measure(fn, client, warm: bool):
+    if warm:
+        fn(client)
+    client.reset_counters()
+    start = time.perf_counter()
+    fn(client)
+    seconds = time.perf_counter() - start
+    round_trips = client.round_trips
+    payload = sum(c['bytes'] for c in client.calls)
+
+    if warm:
+        fn(client)
+    tracemalloc.start()
+    fn(client)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'seconds': round(seconds, 6),
+        'round_trips': round_trips,
+        'payload_bytes': payload,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+def run(tiers=tuple(TIERS), latency_ms: float = 0.0, seed: int = 0) -> dict:
+    results = []
+    for tier in tiers:
+        members, expenses, participants = TIERS[tier]
+        tables = generate_office(members, expenses, participants, seed)
+        for case, (fn, warm) in CASES.items():
+            client = FakeClient(tables, latency=latency_ms / 1000)
+            utils._mirrors.clear()
+            utils.invalidate_cache()
+            results.append({'tier': tier, 'case': case, **_measure(fn, client, warm)})
+            print(f"{tier:>6} {case:<28} {results[-1]['seconds']:>10.4f}s "
+                  f"{results[-1]['round_trips']:>4} trips {results[-1]['peak_kib']:>10.1f} KiB", file=sys.stderr)
+    return {'meta': _meta(latency_ms, seed), 'results': results}
+
+def _meta(latency_ms, seed):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'latency_ms': latency_ms,
+        'seed': seed,
+        'tiers': {t: dict(zip(('members', 'expenses', 'participants'), TIERS[t])) for t in TIERS},
+    }
+
+def compare(baseline: dict, current: dict):
+    # Prints time ratios (current / baseline) per tier and case
+    old = {(r['tier'], r['case']): r for r in baseline['results']}
+    for r in current['results']:
+        b = old.get((r['tier'], r['case']))
+        if b is None or not b['seconds']:
+            continue
+        print(f"{r['tier']:>6} {r['case']:<28} x{r['seconds'] / b['seconds']:.2f} time, "
+              f"{r['round_trips'] - b['round_trips']:+d} trips, x{r['peak_kib'] / max(b['peak_kib'], 0.1):.2f} memory")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the utils data layer against a fake Supabase client.')
+    parser.add_argument('--tiers', nargs='+', choices=list(TIERS), default=list(TIERS))
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated round-trip latency in ms')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='write results JSON here (default: stdout)')
+    parser.add_argument('--compare', help='baseline results JSON to compare against')
+    args = parser.parse_args()
+
+    report = run(args.tiers, args.latency, args.seed)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
@@ -0,0 +1,49 @@
+# Settlement strategies: runtime and transfer count by group size.
+#   python -m benchmarks.settlements
+import random
+import time
+
+import pandas as pd
+
+import settlements
+
+SIZES = (10, 100, 1000)
+
+def synthetic_balances(n_members: int, seed: int = 0) -> pd.DataFrame:
+    # Net out a batch of random IOUs so balances sum to zero and contain some
+    # zero-sum subgroups, like a real office ledger
+    rng = random.Random(seed)
+    cents = [0] * n_members
+    for _ in range(n_members * 3):
+        a, b = rng.sample(range(n_members), 2)
+        amt = rng.choice((5000, 12000, 25000, rng.randint(1, 50000)))
+        cents[a] += amt
+        cents[b] -= amt
+    return pd.DataFrame({
+        'member_id': range(1, n_members + 1),
+        'name': [f'member_{i}' for i in range(1, n_members + 1)],
+        'balance_cents': cents,
+    })
+
+def run(sizes=SIZES, seed: int = 0):
+    results = []
+    for n in sizes:
+        bal_df = synthetic_balances(n, seed)
+        nonzero = int((bal_df['balance_cents'] != 0).sum())
+        for name in settlements.STRATEGIES:
+            if name == 'exact' and nonzero > settlements.EXACT_MAX_MEMBERS:
+                continue
+            start = time.perf_counter()
+            transfers = settlements.suggest_settlements(bal_df, strategy=name)
+            elapsed = time.perf_counter() - start
+            results.append({
+                'members': n,
+                'strategy': name,
+                'seconds': round(elapsed, 6),
+                'transfers': len(transfers),
+                'upper_bound': nonzero - 1,
+            })
+    return results
+
+if __name__ == '__main__':
+    print(pd.DataFrame(run()).to_string(index=False))
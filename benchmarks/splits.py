@@ -0,0 +1,60 @@
+# Split engine throughput per mode, after checking its invariants on the same
+# batch: shares add up to each total, none is negative, and each is within one
+# cent of its exact proportional amount.
+#   python -m benchmarks.splits --expenses 1000000
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import splits
+
+def synthetic_batch(mode: str, n_expenses: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    totals = rng.integers(1, 5_000_000, n_expenses)
+    counts = rng.integers(2, 9, n_expenses)  # ~5 participants on average
+    size = int(counts.sum())
+    if mode == 'equal':
+        return totals, counts, None
+    if mode == 'shares':
+        return totals, counts, rng.integers(1, 5, size)
+    # percent / exact: random weights spread over 10000 bps or the total
+    weights = rng.integers(1, 100, size)
+    target = np.full(n_expenses, 10_000) if mode == 'percent' else totals
+    values = splits.allocate(target, counts, weights)
+    return totals, counts, values / 100 if mode == 'percent' else values
+
+def check(totals, counts, mode, values, shares):
+    starts = np.cumsum(counts) - counts
+    assert (np.add.reduceat(shares, starts) == totals).all(), f'{mode}: shares do not add up'
+    assert (shares >= 0).all(), f'{mode}: negative share'
+    weights = np.ones(shares.size) if values is None else np.asarray(values, dtype=np.float64)
+    exact = np.repeat(totals, counts) * weights / np.repeat(np.add.reduceat(weights, starts), counts)
+    assert (np.abs(shares - exact) < 1 + 1e-6).all(), f'{mode}: share more than a cent off'
+
+def run(n_expenses: int = 1_000_000, seed: int = 0, repeat: int = 3):
+    results = []
+    for mode in splits.MODES:
+        totals, counts, values = synthetic_batch(mode, n_expenses, seed)
+        check(totals, counts, mode, values, splits.split_batch(totals, counts, mode, values))
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            splits.split_batch(totals, counts, mode, values)
+            best = min(best, time.perf_counter() - start)
+        results.append({
+            'mode': mode,
+            'expenses': n_expenses,
+            'shares': int(counts.sum()),
+            'seconds': round(best, 4),
+            'mshares_per_s': round(counts.sum() / best / 1e6, 2),
+        })
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check split invariants and measure split engine throughput.')
+    parser.add_argument('--expenses', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(pd.DataFrame(run(args.expenses, args.seed)).to_string(index=False))
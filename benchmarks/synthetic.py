@@ -0,0 +1,40 @@
+# Seeded synthetic office ledgers shaped like the Supabase tables.
+import datetime
+import random
+
+import ledger
+import splits
+
+def generate_office(members: int, expenses: int, participants: int, seed: int = 0, group_id: int = 1) -> dict:
+    # M members, E expenses, K participants per expense (capped at M), with
+    # shares split exactly in cents so balances net to zero. All rows belong
+    # to group_id.
+    rng = random.Random(seed)
+    k = min(participants, members)
+    start = datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+    titles = ['Lunch', 'Coffee', 'Cab', 'Snacks', 'Team dinner', 'Groceries', 'Offsite', 'Gift']
+
+    member_rows = [{'id': i, 'group_id': group_id, 'name': f'Member {i:05d}'} for i in range(1, members + 1)]
+    expense_rows, transaction_rows = [], []
+    for eid in range(1, expenses + 1):
+        cents = rng.randint(100, 500_000)
+        chosen = rng.sample(range(1, members + 1), k)
+        created = start + datetime.timedelta(minutes=eid * 7 + rng.randint(0, 6))
+        expense_rows.append({
+            'id': eid,
+            'group_id': group_id,
+            'title': rng.choice(titles),
+            'payer_id': rng.choice(chosen),
+            'amount': ledger.from_cents(cents),
+            'description': f'Synthetic expense {eid} ' + 'x' * rng.randint(0, 80),
+            'created_at': created.isoformat(),
+        })
+        for mid, share in zip(chosen, splits.split(cents, k).tolist()):
+            transaction_rows.append({
+                'id': len(transaction_rows) + 1,
+                'group_id': group_id,
+                'expense_id': eid,
+                'member_id': mid,
+                'amount': ledger.from_cents(share),
+            })
+    return {'members': member_rows, 'expenses': expense_rows, 'transactions': transaction_rows}
@@ -1,110 +1,210 @@
 # data_handlers.py
 
+import threading
+import time
+from types import MappingProxyType
+
 import streamlit as st
 import pandas as pd
 from decimal import Decimal
-import uuid # To generate unique IDs for guest mode
+
+import ledger
 
 # --- Database Handler (For Admin Mode) ---
 class SupabaseDataHandler:
-    def __init__(self, supabase_client, utils):
+    def __init__(self, supabase_client, utils, group_id=None):
         self.supabase = supabase_client
         self.utils = utils
+        self.group_id = utils.DEFAULT_GROUP_ID if group_id is None else group_id
         st.success("✅ Connected to Database. You are in **Admin Mode**.")
 
     def fetch_members(self):
-        return self.utils.fetch_members(self.supabase)
+        return self.utils.fetch_members(self.supabase, self.group_id)
 
     def create_member(self, name):
-        return self.utils.create_member(self.supabase, name)
+        return self.utils.create_member(self.supabase, name, self.group_id)
 
     def fetch_history(self):
-        return self.utils.fetch_history(self.supabase)
-    
-    def create_expense(self, payer_id, amount, title, description, participant_ids):
+        return self.utils.fetch_history(self.supabase, self.group_id)
+
+    def create_expense(self, payer_id, amount, title, description, participant_ids, split_mode='equal', split_values=None):
         return self.utils.create_expense_with_transactions(
-            self.supabase, payer_id, amount, title, description, participant_ids
+            self.supabase, payer_id, amount, title, description, participant_ids,
+            group_id=self.group_id, split_mode=split_mode, split_values=split_values,
         )
-    
+
+    def delete_expense(self, expense_id):
+        return self.utils.delete_expense(self.supabase, expense_id, self.group_id)
+
+    def delete_expenses(self, expense_ids):
+        return self.utils.delete_expenses(self.supabase, expense_ids, self.group_id)
+
     def compute_balances(self):
-        return self.utils.compute_balances(self.supabase)
+        return self.utils.compute_balances(self.supabase, group_id=self.group_id)
+
+# --- Shared guest snapshot ---
+# Guest sessions are seeded from the real ledger, but instead of each session
+# reading the DB and keeping its own copy, every guest shares one read-only
+# snapshot per group and process. A session pins the snapshot it started on
+# (a reference, not a copy) and records only its own adds/deletes in an
+# overlay; reads merge the two. Snapshots are rebuilt after
+# GUEST_SNAPSHOT_TTL_SECONDS for new sessions, and old ones are freed once no
+# session holds them.
+GUEST_SNAPSHOT_TTL_SECONDS = 300.0
+
+class LedgerSnapshot:
+    # Never mutated after construction; the dicts are exposed read-only
+    def __init__(self, version, group_id, members, expenses, transactions, utils):
+        self.version = version
+        self.group_id = group_id
+        self.loaded_at = time.monotonic()
+        self.members = tuple({'id': m['id'], 'name': m['name']} for m in members)
+        self.history = utils._build_history(members, expenses, transactions)
+
+        book = ledger.Ledger([m['id'] for m in members])
+        book.add_expenses(expenses)
+        book.add_transactions(transactions)
+        self.balances = MappingProxyType(dict(zip(book.member_ids.tolist(), book.balances.tolist())))
+
+        # expense id -> (payer_id, cents, ((member_id, cents), ...)) so a guest
+        # can delete a snapshot expense by reversing its effect in the overlay
+        shares = {}
+        for t in transactions:
+            shares.setdefault(t['expense_id'], []).append((t['member_id'], ledger.to_cents(t['amount'])))
+        self.expenses = MappingProxyType({
+            e['id']: (e['payer_id'], ledger.to_cents(e['amount']), tuple(shares.get(e['id'], ())))
+            for e in expenses
+        })
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+_snapshot_version = [0]
+
+def shared_snapshot(supabase_client, utils, group_id) -> LedgerSnapshot:
+    if supabase_client is None:
+        # No database to seed from. utils would read this session's own guest
+        # store, which must never be published to other sessions: start empty.
+        return LedgerSnapshot(0, group_id, [], [], [], utils)
+    with _snapshots_lock:
+        snap = _snapshots.get(group_id)
+        if snap is None or time.monotonic() - snap.loaded_at > GUEST_SNAPSHOT_TTL_SECONDS:
+            tables = utils.fetch_tables(supabase_client, group_id=group_id)
+            _snapshot_version[0] += 1
+            snap = _snapshots[group_id] = LedgerSnapshot(
+                _snapshot_version[0], group_id,
+                tables['members'], tables['expenses'], tables['transactions'], utils,
+            )
+        return snap
+
+class GuestOverlay:
+    # One guest's changes on top of a snapshot. New rows get negative ids so
+    # they never collide with database ids.
+    def __init__(self):
+        self.members = []
+        self.history = []
+        self.expenses = {}
+        self.deleted = set()
+        self.balance_delta = {}
+        self._next_id = -1
+
+    def new_id(self) -> int:
+        new_id = self._next_id
+        self._next_id -= 1
+        return new_id
+
+    def adjust(self, member_id, cents):
+        self.balance_delta[member_id] = self.balance_delta.get(member_id, 0) + cents
 
 # --- Session State Handler (For Guest Mode) ---
 class SessionStateDataHandler:
-    def __init__(self, supabase_client, utils):
+    def __init__(self, supabase_client, utils, group_id=None):
         st.info("ℹ️ You are in **Guest Mode**. All changes are temporary and will be lost on refresh.")
-        if 'guest_data' not in st.session_state:
-            # On first run, seed the guest session with real data from the DB
-            members_df = utils.fetch_members(supabase_client)
-            history_df = utils.fetch_history(supabase_client)
-            st.session_state.guest_data = {
-                'members': members_df.to_dict('records'),
-                'history': history_df.to_dict('records')
-            }
+        self.utils = utils
+        group_id = utils.DEFAULT_GROUP_ID if group_id is None else group_id
+        if st.session_state.get('guest_snapshot') is None or st.session_state.guest_snapshot.group_id != group_id:
+            # On first run, pin the shared snapshot of the real data; only the
+            # first guest per TTL window pays for the DB read
+            st.session_state.guest_snapshot = shared_snapshot(supabase_client, utils, group_id)
+            st.session_state.guest_overlay = GuestOverlay()
+        self.snapshot = st.session_state.guest_snapshot
+        self.overlay = st.session_state.guest_overlay
+
+    def _all_members(self):
+        return [*self.snapshot.members, *self.overlay.members]
 
     def fetch_members(self):
-        return pd.DataFrame(st.session_state.guest_data['members'])
+        return self.utils._members_frame(self._all_members())
 
     def create_member(self, name):
-        new_member = {'id': str(uuid.uuid4()), 'name': name}
-        st.session_state.guest_data['members'].append(new_member)
+        name = name.strip()
+        if not name:
+            return None
+        for m in self._all_members():
+            if m['name'].lower() == name.lower():
+                return m
+        new_member = {'id': self.overlay.new_id(), 'name': name}
+        self.overlay.members.append(new_member)
         return new_member
 
     def fetch_history(self):
-        return pd.DataFrame(st.session_state.guest_data['history'])
-
-    def create_expense(self, payer_id, amount, title, description, participant_ids):
-        num_participants = len(participant_ids)
-        if num_participants == 0: return None
-        
-        split_amount = amount / Decimal(num_participants)
-        
-        members_df = self.fetch_members()
-        name_map = members_df.set_index('id')['name'].to_dict()
-
-        payer_name = name_map.get(payer_id)
-        participant_names = [name_map.get(pid) for pid in participant_ids]
-
-        new_expense_id = str(uuid.uuid4())
-        
-        for participant_id in participant_ids:
-            new_row = {
-                'expense_id': new_expense_id,
+        # Never hand out the shared snapshot frame itself: callers get their
+        # own frame (a shallow copy; pandas copy-on-write keeps it cheap)
+        base = self.snapshot.history
+        if self.overlay.deleted:
+            base = base[~base['expense_id'].isin(list(self.overlay.deleted))]
+        if not self.overlay.history:
+            return base.copy(deep=False)
+        mine = self.utils._history_frame({c: [r[c] for r in self.overlay.history] for c in self.utils.HISTORY_COLUMNS})
+        return pd.concat([base, mine], ignore_index=True)
+
+    def create_expense(self, payer_id, amount, title, description, participant_ids, split_mode='equal', split_values=None):
+        if not participant_ids:
+            return None
+        amount = Decimal(str(amount))
+        names = {m['id']: m['name'] for m in self._all_members()}
+        cents = ledger.to_cents_array(self.utils._split_amount(amount, participant_ids, split_mode, split_values)).tolist()
+        expense_id = self.overlay.new_id()
+        created_at = pd.Timestamp.now(tz='UTC').isoformat()
+
+        self.overlay.adjust(payer_id, ledger.to_cents(amount))
+        for participant_id, share in zip(participant_ids, cents):
+            self.overlay.adjust(participant_id, -share)
+            self.overlay.history.append({
+                'expense_id': expense_id,
+                'date': created_at,
                 'title': title,
+                'payer': names.get(payer_id),
+                'member': names.get(participant_id),
+                'share': ledger.from_cents(share),
+                'total_amount': float(amount),
                 'description': description,
-                'amount': float(amount),
-                'payer_name': payer_name,
-                'participant_name': name_map.get(participant_id),
-                'share_amount': float(round(split_amount, 2)),
-                'created_at': pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-            st.session_state.guest_data['history'].append(new_row)
-        return new_expense_id
+            })
+        self.overlay.expenses[expense_id] = (payer_id, ledger.to_cents(amount), tuple(zip(participant_ids, cents)))
+        return expense_id
+
+    def delete_expense(self, expense_id):
+        overlay = self.overlay
+        if expense_id in overlay.expenses:
+            payer_id, total, shares = overlay.expenses.pop(expense_id)
+            overlay.history = [r for r in overlay.history if r['expense_id'] != expense_id]
+        elif expense_id in self.snapshot.expenses and expense_id not in overlay.deleted:
+            payer_id, total, shares = self.snapshot.expenses[expense_id]
+            overlay.deleted.add(expense_id)
+        else:
+            return False
+        overlay.adjust(payer_id, -total)
+        for member_id, share in shares:
+            overlay.adjust(member_id, share)
+        return True
+
+    def delete_expenses(self, expense_ids):
+        return [eid for eid in dict.fromkeys(expense_ids) if self.delete_expense(eid)]
 
     def compute_balances(self):
-        history_df = self.fetch_history()
-        if history_df.empty:
-            return pd.DataFrame(columns=['id', 'name', 'balance'])
-
-        balances = {}
-        # Populate all members with zero balance first
-        for member in st.session_state.guest_data['members']:
-            balances[member['name']] = Decimal('0.0')
-
-        for _, row in history_df.iterrows():
-            payer = row['payer_name']
-            participant = row['participant_name']
-            share = Decimal(str(row['share_amount']))
-            
-            # Payer gets credited
-            balances[payer] += share
-            # Participant gets debited
-            balances[participant] -= share
-            
-        bal_df = pd.DataFrame(list(balances.items()), columns=['name', 'balance'])
-        
-        # Merge with members df to get IDs
-        members_df = self.fetch_members()
-        bal_df = pd.merge(bal_df, members_df, on='name', how='left')
-        
-        return bal_df[['id', 'name', 'balance']]
+        members = self._all_members()
+        base, delta = self.snapshot.balances, self.overlay.balance_delta
+        return self.utils._balances_frame(
+            [m['id'] for m in members],
+            [m['name'] for m in members],
+            [base.get(m['id'], 0) + delta.get(m['id'], 0) for m in members],
+        )
@@ -0,0 +1,176 @@
+import argparse
+import csv
+import datetime
+import os
+import tempfile
+from collections import defaultdict
+from typing import Iterator, Optional, Union
+from supabase import Client
+
+import utils
+
+# Expenses are read in keyset pages and each page's transactions are fetched
+# with an expense_id IN (...) filter, so memory holds one page of the join at
+# a time. Kept well below PAGE_SIZE because the ids travel in the URL.
+EXPORT_PAGE_SIZE = 200
+PARQUET_CHUNK_ROWS = 50_000
+
+def _expense_filters(start: Optional[datetime.date], end: Optional[datetime.date]):
+    filters = []
+    if start is not None:
+        filters.append(('gte', 'created_at', start.isoformat()))
+    if end is not None:
+        filters.append(('lt', 'created_at', (end + datetime.timedelta(days=1)).isoformat()))
+    return filters
+
+def _resolve_member(members: dict, member: Union[int, str, None]) -> Optional[int]:
+    if member is None or member in members:
+        return member
+    by_name = {name: mid for mid, name in members.items()}
+    if member not in by_name:
+        raise ValueError(f'unknown member: {member!r}')
+    return by_name[member]
+
+def _history_row(e: dict, t: dict, members: dict) -> dict:
+    return {
+        'expense_id': e['id'],
+        'date': e.get('created_at'),
+        'title': e.get('title'),
+        'payer': members.get(e.get('payer_id')),
+        'member': members.get(t.get('member_id')),
+        'share': t.get('amount'),
+        'total_amount': e.get('amount'),
+        'description': e.get('description'),
+    }
+
+def _guest_pages(start, end, member_id, group_id):
+    # Guest data already lives in session memory; filter it through the store indexes
+    store = utils.init_guest_data(group_id)
+    start_s = start.isoformat() if start else None
+    end_s = end.isoformat() if end else None
+    expenses, by_expense = [], {}
+    for e in store.expenses.values():
+        day = (e.created_at or '')[:10]
+        if (start_s is not None and day < start_s) or (end_s is not None and day > end_s):
+            continue
+        expenses.append(e.as_dict())
+        by_expense[e.id] = [
+            t.as_dict() for t in store.transactions_for(e.id)
+            if member_id is None or t.member_id == member_id
+        ]
+    yield expenses, by_expense
+
+def _db_pages(supabase: Client, start, end, member_id, page_size, group_id):
+    expense_filters = utils._in_group(group_id, *_expense_filters(start, end))
+    for page in utils.iter_pages(supabase, 'expenses', utils.COLUMNS['expenses'], page_size, expense_filters):
+        filters = utils._in_group(group_id, ('in_', 'expense_id', [e['id'] for e in page]))
+        if member_id is not None:
+            filters.append(('eq', 'member_id', member_id))
+        by_expense = defaultdict(list)
+        for t in utils.iter_table(supabase, 'transactions', utils.COLUMNS['transactions'], filters=filters):
+            by_expense[t['expense_id']].append(t)
+        yield page, by_expense
+
+def iter_history_rows(
+    supabase: Optional[Client],
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+    member: Union[int, str, None] = None,
+    page_size: int = EXPORT_PAGE_SIZE,
+    group_id: int = utils.DEFAULT_GROUP_ID,
+) -> Iterator[dict]:
+    # Yields fetch_history rows (expense x participant) of one group in
+    # expense id order. start/end are inclusive dates; member is a member id
+    # or name.
+    # Login Mode reads members only, never the mirror, so memory stays one page
+    rows = utils.init_guest_data(group_id).iter_rows('members') if supabase is None \
+        else utils._members_only(supabase, group_id)
+    members = {m['id']: m['name'] for m in rows}
+    member_id = _resolve_member(members, member)
+    pages = _guest_pages(start, end, member_id, group_id) if supabase is None \
+        else _db_pages(supabase, start, end, member_id, page_size, group_id)
+    for expenses, by_expense in pages:
+        for e in expenses:
+            for t in by_expense.get(e['id'], ()):
+                yield _history_row(e, t, members)
+
+def write_history_csv(supabase: Optional[Client], fileobj, **filters) -> int:
+    writer = csv.DictWriter(fileobj, fieldnames=utils.HISTORY_COLUMNS)
+    writer.writeheader()
+    count = 0
+    for row in iter_history_rows(supabase, **filters):
+        writer.writerow(row)
+        count += 1
+    return count
+
+def write_history_parquet(supabase: Optional[Client], path: str, chunk_rows: int = PARQUET_CHUNK_ROWS, **filters) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError('Parquet export needs pyarrow (pip install pyarrow)') from e
+
+    schema = pa.schema([
+        ('expense_id', pa.int64()),
+        ('date', pa.string()),
+        ('title', pa.string()),
+        ('payer', pa.string()),
+        ('member', pa.string()),
+        ('share', pa.float64()),
+        ('total_amount', pa.float64()),
+        ('description', pa.string()),
+    ])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        buffer = {c: [] for c in utils.HISTORY_COLUMNS}
+        for row in iter_history_rows(supabase, **filters):
+            for c in utils.HISTORY_COLUMNS:
+                buffer[c].append(row[c])
+            count += 1
+            if len(buffer['expense_id']) >= chunk_rows:
+                writer.write_table(pa.table(buffer, schema=schema))
+                buffer = {c: [] for c in utils.HISTORY_COLUMNS}
+        if buffer['expense_id'] or count == 0:
+            writer.write_table(pa.table(buffer, schema=schema))
+    return count
+
+def export_history(supabase: Optional[Client], path: str, fmt: str = 'csv', **filters) -> int:
+    if fmt == 'csv':
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            return write_history_csv(supabase, f, **filters)
+    if fmt == 'parquet':
+        return write_history_parquet(supabase, path, **filters)
+    raise ValueError(f'unsupported export format: {fmt}')
+
+def export_history_tempfile(supabase: Optional[Client], fmt: str = 'csv', **filters) -> str:
+    fd, path = tempfile.mkstemp(suffix=f'.{fmt}', prefix='splitwise_history_')
+    os.close(fd)
+    export_history(supabase, path, fmt, **filters)
+    return path
+
+def backup_history(supabase: Client, directory: str, fmt: str = 'csv', **filters) -> str:
+    # For scheduled backups: writes history_<UTC timestamp>.<fmt> into directory
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    path = os.path.join(directory, f'history_{stamp}.{fmt}')
+    export_history(supabase, path, fmt, **filters)
+    return path
+
+if __name__ == '__main__':
+    # python export.py backups/ --format parquet --start 2024-01-01
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    parser = argparse.ArgumentParser(description='Export expense history from Supabase.')
+    parser.add_argument('directory')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--start', type=datetime.date.fromisoformat)
+    parser.add_argument('--end', type=datetime.date.fromisoformat)
+    parser.add_argument('--member')
+    parser.add_argument('--group', type=int, default=utils.DEFAULT_GROUP_ID, help='group id to export')
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = create_client(os.environ['SUPABASE_URL'], os.environ['SUPABASE_ANON_KEY'])
+    print(backup_history(client, args.directory, args.format, start=args.start, end=args.end, member=args.member,
+                         group_id=args.group))
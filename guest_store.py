@@ -0,0 +1,124 @@
+import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import ledger
+import rollups
+
+# In-memory ledger for Guest Mode. Rows are __slots__ records keyed by id,
+# with a lowercase-name index, an expense -> transactions index, a member ->
+# expenses index (paid for or shared, for statements), monotonic id counters
+# and balances (int cents) and spending rollups kept up to date on every
+# insert/delete.
+
+class _Record:
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for field, value in zip(self.__slots__, values):
+            setattr(self, field, value)
+
+    def as_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+class Member(_Record):
+    __slots__ = ('id', 'name')
+
+class Expense(_Record):
+    __slots__ = ('id', 'title', 'payer_id', 'amount', 'description', 'created_at')
+
+class Transaction(_Record):
+    __slots__ = ('id', 'expense_id', 'member_id', 'amount')
+
+class GuestStore:
+    def __init__(self):
+        self.members: Dict[int, Member] = {}
+        self.expenses: Dict[int, Expense] = {}
+        self.balances: Dict[int, int] = {}
+        self._names: Dict[str, int] = {}
+        self._by_expense: Dict[int, List[Transaction]] = {}
+        self._by_member: Dict[int, Dict[int, None]] = {}
+        self.rollups = rollups.SpendingRollups()
+        self._next_id = {'members': 1, 'expenses': 1, 'transactions': 1}
+
+    def _new_id(self, table: str) -> int:
+        new_id = self._next_id[table]
+        self._next_id[table] = new_id + 1
+        return new_id
+
+    # ---------- Members ----------
+    def find_member(self, name: str) -> Optional[Member]:
+        mid = self._names.get(name.lower())
+        return self.members[mid] if mid is not None else None
+
+    def add_member(self, name: str) -> Member:
+        existing = self.find_member(name)
+        if existing is not None:
+            return existing
+        member = Member(self._new_id('members'), name)
+        self.members[member.id] = member
+        self._names[name.lower()] = member.id
+        self.balances[member.id] = 0
+        return member
+
+    # ---------- Expenses ----------
+    def add_expense(
+        self,
+        payer_id: int,
+        amount: float,
+        title: str,
+        description: str,
+        shares: List[Tuple[int, float]],
+        created_at: Optional[str] = None,
+    ) -> int:
+        expense = Expense(
+            self._new_id('expenses'), title, payer_id, amount, description,
+            created_at or datetime.datetime.now().isoformat(),
+        )
+        self.expenses[expense.id] = expense
+        self.balances[payer_id] += ledger.to_cents(amount)
+        self._by_member.setdefault(payer_id, {})[expense.id] = None
+        rows = []
+        for member_id, share in shares:
+            rows.append(Transaction(self._new_id('transactions'), expense.id, member_id, share))
+            self.balances[member_id] -= ledger.to_cents(share)
+            self._by_member.setdefault(member_id, {})[expense.id] = None
+        self._by_expense[expense.id] = rows
+        self.rollups.apply(
+            expense.created_at, payer_id, ledger.to_cents(amount), title,
+            [(t.member_id, ledger.to_cents(t.amount)) for t in rows],
+        )
+        return expense.id
+
+    def delete_expense(self, expense_id: int) -> bool:
+        expense = self.expenses.pop(expense_id, None)
+        if expense is None:
+            return False
+        self.balances[expense.payer_id] -= ledger.to_cents(expense.amount)
+        self._by_member.get(expense.payer_id, {}).pop(expense_id, None)
+        self.rollups.apply(
+            expense.created_at, expense.payer_id, ledger.to_cents(expense.amount), expense.title,
+            [(t.member_id, ledger.to_cents(t.amount)) for t in self.transactions_for(expense_id)], sign=-1,
+        )
+        for t in self._by_expense.pop(expense_id, ()):
+            self.balances[t.member_id] += ledger.to_cents(t.amount)
+            self._by_member.get(t.member_id, {}).pop(expense_id, None)
+        return True
+
+    def transactions_for(self, expense_id: int) -> List[Transaction]:
+        return self._by_expense.get(expense_id, [])
+
+    def expenses_of(self, member_id: int) -> List[Expense]:
+        # Expenses the member paid for or shares, in insertion order
+        return [self.expenses[eid] for eid in self._by_member.get(member_id, ())]
+
+    # ---------- Row views for the utils data access layer ----------
+    def iter_rows(self, table: str) -> Iterator[dict]:
+        if table == 'members':
+            records = self.members.values()
+        elif table == 'expenses':
+            records = self.expenses.values()
+        elif table == 'transactions':
+            records = (t for rows in self._by_expense.values() for t in rows)
+        else:
+            raise KeyError(table)
+        return (r.as_dict() for r in records)
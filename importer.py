@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+from typing import Callable, Optional
+from supabase import Client
+
+import ledger
+import splits
+import utils
+
+# Expected columns; participants are names separated by PARTICIPANT_SEP and
+# default to the payer when empty. description and date are optional.
+REQUIRED_COLUMNS = ['title', 'amount', 'payer', 'participants']
+OPTIONAL_COLUMNS = ['description', 'date']
+PARTICIPANT_SEP = ';'
+CHUNK_SIZE = 500
+
+def _is_excel(name: str) -> bool:
+    return name.lower().endswith(('.xlsx', '.xls'))
+
+def _load(source):
+    # Excel has no streaming reader, so the sheet is read once here and every
+    # pass slices that frame; CSV sources are returned as is and streamed
+    name = getattr(source, 'name', source if isinstance(source, str) else '')
+    if not _is_excel(name):
+        return source
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return pd.read_excel(source, dtype=str).fillna('')
+
+def _read_chunks(source, chunk_size: int):
+    # `source` as returned by _load: a loaded sheet, or a CSV streamed with
+    # read_csv(chunksize=...) from the start on every pass
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunk_size):
+            yield source.iloc[start:start + chunk_size]
+        return
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    yield from pd.read_csv(source, chunksize=chunk_size, dtype=str, keep_default_na=False)
+
+def _split_names(value) -> list:
+    if not isinstance(value, str):
+        return []
+    return [n.strip() for n in value.split(PARTICIPANT_SEP) if n.strip()]
+
+def _resolve_members(supabase: Optional[Client], source, chunk_size: int, group_id: int):
+    # One validating pass, then every missing member created in a single
+    # batch. Only names on rows that pass _validate_chunk count, so a rejected
+    # row never adds people to the group. Names match case-insensitively, like
+    # Guest Mode's create_member. Also returns the row count so progress can
+    # be reported as a fraction.
+    # Login Mode reads members only, not the whole mirror
+    members = utils._get_members(None, group_id) if supabase is None else utils._members_only(supabase, group_id)
+    member_map = {m['name'].lower(): m['id'] for m in members}
+    missing, total = {}, 0
+    for chunk in _read_chunks(source, chunk_size):
+        total += len(chunk)
+        valid, _ = _validate_chunk(chunk)
+        for _, payer, participants, _, _ in valid:
+            for name in [payer, *participants]:
+                if name.lower() not in member_map:
+                    missing.setdefault(name.lower(), name)
+    for m in utils.create_members_bulk(supabase, list(missing.values()), group_id):
+        member_map[m['name'].lower()] = m['id']
+    return member_map, total
+
+def _validate_chunk(chunk: pd.DataFrame):
+    # Returns (pos, payer name, participant names, cents, created_at) per valid
+    # row, and the per-row errors
+    errors = []
+    amounts = pd.to_numeric(chunk['amount'], errors='coerce')
+    cents = np.rint(amounts.to_numpy(dtype=np.float64, na_value=np.nan) * 100)
+    dates = pd.to_datetime(chunk['date'].replace('', None), errors='coerce', utc=True) \
+        if 'date' in chunk else pd.Series(pd.NaT, index=chunk.index)
+
+    valid = []
+    for pos, (line, payer, participants, amount, cent, date) in enumerate(zip(
+            chunk.index, chunk['payer'], chunk['participants'], amounts, cents, dates)):
+        row = line + 2  # header is line 1
+        if pd.isna(amount) or amount <= 0:
+            errors.append({'row': row, 'error': f"invalid amount: {chunk['amount'].iloc[pos]!r}"})
+            continue
+        if abs(amount * 100 - cent) > 1e-6:
+            errors.append({'row': row, 'error': f'amount has more than two decimals: {amount}'})
+            continue
+        payer_names = _split_names(payer)
+        if len(payer_names) != 1:
+            errors.append({'row': row, 'error': f'expected exactly one payer, got {payer!r}'})
+            continue
+        if 'date' in chunk and chunk['date'].iloc[pos] and pd.isna(date):
+            errors.append({'row': row, 'error': f"invalid date: {chunk['date'].iloc[pos]!r}"})
+            continue
+        valid.append((pos, payer_names[0], _split_names(participants), int(cent), None if pd.isna(date) else date.isoformat()))
+    return valid, errors
+
+def import_expenses(
+    supabase: Optional[Client],
+    source,
+    chunk_size: int = CHUNK_SIZE,
+    progress: Optional[Callable[[int, int], None]] = None,
+    group_id: int = utils.DEFAULT_GROUP_ID,
+) -> dict:
+    # `source` is a path or file-like object (e.g. a Streamlit UploadedFile).
+    # Members and expenses are created in (and matched against) group_id.
+    # Each valid chunk is written with one create_expenses_bulk call and
+    # progress(rows_done, total_rows) is called after it. The report lists
+    # created ids and per-row errors (row = spreadsheet line number).
+    source = _load(source)
+    header = source if isinstance(source, pd.DataFrame) else next(_read_chunks(source, 1), pd.DataFrame())
+    missing_cols = [c for c in REQUIRED_COLUMNS if c not in header.columns]
+    if missing_cols:
+        raise ValueError(f'missing required columns: {", ".join(missing_cols)}')
+
+    member_map, total = _resolve_members(supabase, source, chunk_size, group_id)
+    created, errors, rows_done = [], [], 0
+
+    for chunk in _read_chunks(source, chunk_size):
+        valid, chunk_errors = _validate_chunk(chunk)
+        errors.extend(chunk_errors)
+        resolved = []
+        for pos, payer, participants, cents, created_at in valid:
+            payer_id = member_map[payer.lower()]
+            participant_ids = list(dict.fromkeys(member_map[n.lower()] for n in participants)) or [payer_id]
+            resolved.append((pos, payer_id, participant_ids, cents, created_at))
+        valid = resolved
+        if valid:
+            counts = [len(v[2]) for v in valid]
+            shares = ledger.from_cents(splits.split_batch([v[3] for v in valid], counts)).tolist()
+            items, offset = [], 0
+            for (pos, payer_id, participant_ids, cents, created_at), n in zip(valid, counts):
+                items.append({
+                    'payer_id': payer_id,
+                    'amount': ledger.from_cents(cents),
+                    'title': chunk['title'].iloc[pos] or '',
+                    'description': chunk['description'].iloc[pos] if 'description' in chunk else '',
+                    'participant_ids': participant_ids,
+                    'created_at': created_at,
+                    'shares': shares[offset:offset + n],
+                })
+                offset += n
+            try:
+                created.extend(utils.create_expenses_bulk(supabase, items, group_id))
+            except Exception as e:
+                errors.extend({'row': chunk.index[v[0]] + 2, 'error': f'write failed: {e}'} for v in valid)
+        rows_done += len(chunk)
+        if progress is not None:
+            progress(rows_done, total)
+
+    return {
+        'rows': rows_done,
+        'created': created,
+        'errors': pd.DataFrame(errors, columns=['row', 'error']),
+    }
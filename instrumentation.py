@@ -0,0 +1,128 @@
+import json
+import time
+import contextvars
+from contextlib import contextmanager, nullcontext
+from typing import Optional
+
+# Per-rerun profile of Supabase calls and timed stages. Nothing is recorded
+# unless begin_rerun(enabled=True) was called for the current script run;
+# otherwise stage() hands back a shared no-op context and the client is
+# left unwrapped, so the disabled cost is one ContextVar lookup per stage.
+HISTORY_SIZE = 20
+
+# Builder methods that decide what a request does; everything else is a filter/modifier
+_OPERATIONS = {'select', 'insert', 'update', 'upsert', 'delete'}
+_NOOP = nullcontext()
+_current: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar('rerun_profile', default=None)
+
+def begin_rerun(enabled: bool, **meta) -> Optional[dict]:
+    if not enabled:
+        _current.set(None)
+        return None
+    profile = {'started_at': time.time(), '_t0': time.perf_counter(), 'meta': meta, 'calls': [], 'stages': []}
+    _current.set(profile)
+    return profile
+
+def end_rerun(history) -> Optional[dict]:
+    # Finalises the current profile and appends it to `history` (a bounded deque)
+    profile = _current.get()
+    if profile is None:
+        return None
+    profile['total_ms'] = round((time.perf_counter() - profile.pop('_t0')) * 1000, 2)
+    history.append(profile)
+    _current.set(None)
+    return profile
+
+def current() -> Optional[dict]:
+    return _current.get()
+
+def annotate(key: str, value):
+    profile = _current.get()
+    if profile is not None:
+        profile['meta'][key] = value
+
+def stage(name: str):
+    if _current.get() is None:
+        return _NOOP
+    return _timed_stage(name)
+
+@contextmanager
+def _timed_stage(name: str):
+    profile = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile['stages'].append({'stage': name, 'ms': round((time.perf_counter() - start) * 1000, 3)})
+
+def _record_call(target: str, op: str, data, ms: float):
+    profile = _current.get()
+    if profile is None:
+        return
+    rows = len(data) if isinstance(data, list) else int(data is not None)
+    profile['calls'].append({
+        'table': target,
+        'op': op,
+        'rows': rows,
+        # Size of the decoded payload re-encoded as JSON; close to the wire size
+        'bytes': len(json.dumps(data, default=str)) if data is not None else 0,
+        'ms': round(ms, 3),
+    })
+
+# ---------- Client wrapper ----------
+class _InstrumentedQuery:
+    __slots__ = ('_builder', '_target', '_op')
+
+    def __init__(self, builder, target: str, op: str):
+        self._builder = builder
+        self._target = target
+        self._op = op
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return _InstrumentedQuery(result, self._target, name if name in _OPERATIONS else self._op)
+        return call
+
+    def execute(self):
+        start = time.perf_counter()
+        resp = self._builder.execute()
+        _record_call(self._target, self._op, resp.data, (time.perf_counter() - start) * 1000)
+        return resp
+
+class InstrumentedClient:
+    # Drop-in proxy for supabase.Client that records every execute()
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name: str):
+        return _InstrumentedQuery(self._client.table(name), name, 'select')
+
+    def rpc(self, fn: str, params=None):
+        return _InstrumentedQuery(self._client.rpc(fn, params or {}), f'rpc:{fn}', 'rpc')
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+def instrument(client):
+    if client is None or _current.get() is None:
+        return client
+    return InstrumentedClient(client)
+
+# ---------- Summaries ----------
+def summarize(profile: dict) -> dict:
+    calls = profile['calls']
+    return {
+        'total_ms': profile.get('total_ms'),
+        'calls': len(calls),
+        'rows': sum(c['rows'] for c in calls),
+        'bytes': sum(c['bytes'] for c in calls),
+        'db_ms': round(sum(c['ms'] for c in calls), 2),
+    }
+
+def export_json(history) -> str:
+    return json.dumps(list(history), indent=2, default=str)
@@ -0,0 +1,65 @@
+import numpy as np
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import islice
+from typing import Iterable, Sequence
+
+# Amounts are stored in Postgres as numeric rupees; everything in here works
+# in int64 paise (cents) so sums are exact and balances always net to zero.
+CHUNK_SIZE = 10_000
+
+# ---------- Conversions ----------
+def to_cents(amount) -> int:
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+def to_cents_array(amounts) -> np.ndarray:
+    # Stored amounts have at most two decimals, so rint(x * 100) is exact
+    return np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)
+
+def from_cents(cents):
+    return cents / 100
+
+# ---------- Balances ----------
+# Per-member balances in int64 cents, indexed by member id
+class Ledger:
+    def __init__(self, member_ids: Sequence[int]):
+        self.member_ids = np.asarray(member_ids, dtype=np.int64)
+        self._order = np.argsort(self.member_ids, kind='stable')
+        self._sorted_ids = self.member_ids[self._order]
+        self.balances = np.zeros(len(self.member_ids), dtype=np.int64)
+
+    def index_of(self, ids) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        pos = np.searchsorted(self._sorted_ids, ids)
+        pos = np.minimum(pos, len(self._sorted_ids) - 1)
+        if len(self._sorted_ids) == 0 or not np.array_equal(self._sorted_ids[pos], ids):
+            missing = sorted(set(ids.tolist()) - set(self.member_ids.tolist()))
+            raise KeyError(f'unknown member ids: {missing}')
+        return self._order[pos]
+
+    def credit(self, ids, cents):
+        if len(ids):
+            np.add.at(self.balances, self.index_of(ids), np.asarray(cents, dtype=np.int64))
+
+    def debit(self, ids, cents):
+        if len(ids):
+            np.subtract.at(self.balances, self.index_of(ids), np.asarray(cents, dtype=np.int64))
+
+    def add_expenses(self, expenses: Iterable[dict], chunk_size: int = CHUNK_SIZE):
+        for chunk in _chunks(expenses, chunk_size):
+            self.credit([e['payer_id'] for e in chunk], to_cents_array([e['amount'] for e in chunk]))
+
+    def add_transactions(self, transactions: Iterable[dict], chunk_size: int = CHUNK_SIZE):
+        for chunk in _chunks(transactions, chunk_size):
+            self.debit([t['member_id'] for t in chunk], to_cents_array([t['amount'] for t in chunk]))
+
+    def total(self) -> int:
+        # Zero whenever every expense's shares add up to its amount
+        return int(self.balances.sum())
+
+def _chunks(rows: Iterable[dict], size: int):
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
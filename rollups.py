@@ -0,0 +1,69 @@
+from typing import Dict, Iterable, List, Tuple
+
+import pandas as pd
+
+import ledger
+
+# Spending rollups: per (month, member) paid/owed totals and per (month, title)
+# spend, updated incrementally on every expense insert/delete so dashboards
+# never scan the history. Months are 'YYYY-MM' taken from created_at. This is
+# the in-Python twin of the spending_rollups/title_rollups tables that the
+# triggers in supabase_schema.sql maintain.
+
+MEMBER_COLUMNS = ['month', 'member_id', 'paid', 'owed', 'paid_count', 'shared_count']
+TITLE_COLUMNS = ['month', 'title', 'amount', 'expenses']
+
+def month_of(created_at) -> str:
+    return str(created_at or '')[:7]
+
+class SpendingRollups:
+    def __init__(self):
+        # (month, member_id) -> [paid cents, owed cents, expenses paid, expenses shared]
+        self.members: Dict[Tuple[str, int], List[int]] = {}
+        # (month, title) -> [cents, expenses]
+        self.titles: Dict[Tuple[str, str], List[int]] = {}
+
+    def _bump(self, table, key, deltas):
+        row = table.setdefault(key, [0] * len(deltas))
+        for i, d in enumerate(deltas):
+            row[i] += d
+        if not any(row):
+            del table[key]
+
+    def apply(self, created_at, payer_id: int, amount_cents: int, title, shares: Iterable[Tuple[int, int]], sign: int = 1):
+        # One expense with its (member_id, cents) shares; sign=-1 removes it
+        month = month_of(created_at)
+        self._bump(self.members, (month, payer_id), (sign * amount_cents, 0, sign, 0))
+        self._bump(self.titles, (month, title or ''), (sign * amount_cents, sign))
+        for member_id, cents in shares:
+            self._bump(self.members, (month, member_id), (0, sign * cents, 0, sign))
+
+    def add_rows(self, expenses, transactions):
+        # Builds the rollups from ledger rows (used when the tables are missing)
+        shares: Dict[int, List[Tuple[int, int]]] = {}
+        for t in transactions:
+            shares.setdefault(t['expense_id'], []).append((t['member_id'], ledger.to_cents(t['amount'])))
+        for e in expenses:
+            self.apply(e['created_at'], e['payer_id'], ledger.to_cents(e['amount']), e['title'], shares.get(e['id'], ()))
+
+    def member_rows(self) -> List[dict]:
+        return [
+            {'month': m, 'member_id': mid, 'paid': v[0], 'owed': v[1], 'paid_count': v[2], 'shared_count': v[3]}
+            for (m, mid), v in self.members.items()
+        ]
+
+    def title_rows(self) -> List[dict]:
+        return [{'month': m, 'title': t, 'amount': v[0], 'expenses': v[1]} for (m, t), v in self.titles.items()]
+
+def member_frame(rows, names) -> pd.DataFrame:
+    # rows in MEMBER_COLUMNS with paid/owed in cents; adds the member name
+    df = pd.DataFrame(list(rows), columns=MEMBER_COLUMNS)
+    df['name'] = pd.Categorical([names.get(mid) for mid in df['member_id']])
+    df['paid'] = ledger.from_cents(df['paid'].to_numpy(dtype='int64'))
+    df['owed'] = ledger.from_cents(df['owed'].to_numpy(dtype='int64'))
+    return df.sort_values(['month', 'member_id'], ignore_index=True)
+
+def title_frame(rows) -> pd.DataFrame:
+    df = pd.DataFrame(list(rows), columns=TITLE_COLUMNS)
+    df['amount'] = ledger.from_cents(df['amount'].to_numpy(dtype='int64'))
+    return df.sort_values(['month', 'title'], ignore_index=True)
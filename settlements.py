@@ -0,0 +1,120 @@
+import pandas as pd
+from collections import defaultdict
+from typing import List, Tuple
+
+# Balances are int cents; a transfer is
+# {'from_id', 'from', 'to_id', 'to', 'amount_cents'} with the debtor paying the creditor.
+EXACT_MAX_MEMBERS = 16
+
+Party = Tuple[object, str, int]  # (member_id, name, balance_cents)
+
+def _transfer(debtor: Party, creditor: Party, cents: int) -> dict:
+    return {'from_id': debtor[0], 'from': debtor[1], 'to_id': creditor[0], 'to': creditor[1], 'amount_cents': cents}
+
+def _parties(bal_df: pd.DataFrame) -> List[Party]:
+    ids = bal_df['member_id'] if 'member_id' in bal_df else bal_df.index
+    return [
+        (mid, name, int(cents))
+        for mid, name, cents in zip(ids.tolist(), bal_df['name'].tolist(), bal_df['balance_cents'].tolist())
+        if cents != 0
+    ]
+
+# ---------- Strategies ----------
+def greedy(parties: List[Party]) -> List[dict]:
+    # Largest creditor against largest debtor, advancing whichever side hits zero
+    creditors = sorted((p for p in parties if p[2] > 0), key=lambda p: -p[2])
+    debtors = sorted((p for p in parties if p[2] < 0), key=lambda p: p[2])
+    owed = [p[2] for p in creditors]
+    owing = [-p[2] for p in debtors]
+
+    transfers = []
+    i, j = 0, 0
+    while i < len(creditors) and j < len(debtors):
+        amt = min(owed[i], owing[j])
+        transfers.append(_transfer(debtors[j], creditors[i], amt))
+        owed[i] -= amt
+        owing[j] -= amt
+        if owed[i] == 0:
+            i += 1
+        if owing[j] == 0:
+            j += 1
+    return transfers
+
+def exact(parties: List[Party]) -> List[dict]:
+    # Minimum transfers = n - (max number of disjoint zero-sum groups). A bitmask
+    # DP finds that partition; each group of k then settles in k - 1 transfers.
+    n = len(parties)
+    if n > EXACT_MAX_MEMBERS:
+        raise ValueError(f'exact settlement supports at most {EXACT_MAX_MEMBERS} non-zero balances, got {n}')
+    if n == 0:
+        return []
+
+    size = 1 << n
+    sums = [0] * size
+    dp = [0] * size
+    for mask in range(1, size):
+        low = mask & -mask
+        sums[mask] = sums[mask ^ low] + parties[low.bit_length() - 1][2]
+        best = 0
+        m = mask
+        while m:
+            bit = m & -m
+            if dp[mask ^ bit] > best:
+                best = dp[mask ^ bit]
+            m ^= bit
+        dp[mask] = best + (sums[mask] == 0)
+
+    # Walk back from the full set to recover an order whose zero-sum prefixes
+    # delimit the groups
+    order = []
+    mask = size - 1
+    while mask:
+        target = dp[mask] - (sums[mask] == 0)
+        m = mask
+        while m:
+            bit = m & -m
+            if dp[mask ^ bit] == target:
+                break
+            m ^= bit
+        order.append(bit.bit_length() - 1)
+        mask ^= bit
+    order.reverse()
+
+    transfers, group, prefix = [], [], 0
+    for i in order:
+        group.append(parties[i])
+        prefix |= 1 << i
+        if sums[prefix] == 0:
+            transfers.extend(greedy(group))
+            group = []
+    # Only non-empty if the balances don't net to zero
+    transfers.extend(greedy(group))
+    return transfers
+
+def heuristic(parties: List[Party]) -> List[dict]:
+    # O(n log n): settle exact opposite pairs in one transfer each, then greedy
+    by_amount = defaultdict(list)
+    for p in parties:
+        if p[2] < 0:
+            by_amount[-p[2]].append(p)
+
+    transfers, rest = [], []
+    for p in parties:
+        if p[2] > 0 and by_amount.get(p[2]):
+            transfers.append(_transfer(by_amount[p[2]].pop(), p, p[2]))
+        elif p[2] > 0:
+            rest.append(p)
+    rest.extend(d for debtors in by_amount.values() for d in debtors)
+    return transfers + greedy(rest)
+
+STRATEGIES = {'greedy': greedy, 'exact': exact, 'heuristic': heuristic}
+
+def suggest_settlements(bal_df: pd.DataFrame, strategy: str = 'auto') -> List[dict]:
+    if bal_df.empty:
+        return []
+    parties = _parties(bal_df)
+    if strategy == 'auto':
+        strategy = 'exact' if len(parties) <= EXACT_MAX_MEMBERS else 'heuristic'
+    if strategy not in STRATEGIES:
+        raise ValueError(f'unknown settlement strategy: {strategy}')
+    return STRATEGIES[strategy](parties)
@@ -0,0 +1,119 @@
+import numpy as np
+from typing import Optional, Sequence, Union
+
+# One split engine for every write path. Works on batches: expense i has
+# counts[i] participants, and per-participant values are passed flattened in
+# expense order (counts[0] values for the first expense, then the next, ...).
+# Shares come back the same way, in int64 cents, and always sum exactly to
+# each expense's total.
+#
+#   equal    values ignored
+#   shares   non-negative weights (2 = twice the share of 1)
+#   percent  percentages summing to 100 per expense (2 decimals)
+#   exact    amounts in cents summing to the total per expense
+#
+# Proportional modes use largest-remainder rounding: everyone gets the floor
+# of their exact share and the leftover cents go to the largest fractional
+# parts, ties to the earlier participant. An equal split therefore gives the
+# extra cents to the first participants.
+MODES = ('equal', 'shares', 'percent', 'exact')
+
+def split(total_cents: int, n: int, mode: str = 'equal', values: Optional[Sequence] = None) -> np.ndarray:
+    return split_batch([total_cents], [n], mode, values)
+
+def split_batch(
+    totals_cents,
+    counts,
+    mode: Union[str, Sequence[str]] = 'equal',
+    values=None,
+) -> np.ndarray:
+    # `mode` is one mode for the whole batch or one per expense
+    totals = np.asarray(totals_cents, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    if totals.shape != counts.shape:
+        raise ValueError('totals and counts must have the same length')
+    if counts.size and counts.min() < 1:
+        raise ValueError('every expense needs at least one participant')
+    size = int(counts.sum())
+    if values is not None:
+        values = np.asarray(values)
+        if values.shape != (size,):
+            raise ValueError(f'expected {size} split values, got {values.size}')
+
+    if isinstance(mode, str):
+        return _split_mode(mode, totals, counts, values)
+
+    modes = np.asarray(mode)
+    if modes.shape != totals.shape:
+        raise ValueError('one mode per expense expected')
+    out = np.empty(size, dtype=np.int64)
+    owner = np.repeat(np.arange(totals.size), counts)
+    for m in np.unique(modes):
+        expenses = modes == m
+        rows = expenses[owner]
+        out[rows] = _split_mode(str(m), totals[expenses], counts[expenses], None if values is None else values[rows])
+    return out
+
+def _split_mode(mode, totals, counts, values) -> np.ndarray:
+    if mode == 'equal':
+        # every remainder ties, so the leftover cents go to the first participants
+        base, leftover = np.divmod(totals, counts)
+        owner = np.repeat(np.arange(totals.size), counts)
+        position = np.arange(owner.size) - (np.cumsum(counts) - counts)[owner]
+        return base[owner] + (position < leftover[owner])
+    if values is None:
+        raise ValueError(f'{mode} split needs per-participant values')
+    if mode == 'shares':
+        weights = values.astype(np.float64)
+        if (weights < 0).any():
+            raise ValueError('share weights must not be negative')
+        if not np.array_equal(weights, np.rint(weights)):
+            # fractional weights in millionths, so allocation stays in integers
+            weights = weights * 1_000_000
+        return allocate(totals, counts, np.rint(weights).astype(np.int64))
+    if mode == 'percent':
+        # basis points keep the arithmetic in integers
+        bps = np.rint(values.astype(np.float64) * 100).astype(np.int64)
+        if (bps < 0).any() or (_group_sums(bps, counts) != 10_000).any():
+            raise ValueError('percentages must be non-negative and add up to 100 for each expense')
+        return allocate(totals, counts, bps)
+    if mode == 'exact':
+        cents = values.astype(np.int64)
+        if (cents < 0).any() or (_group_sums(cents, counts) != totals).any():
+            raise ValueError('exact amounts must be non-negative and add up to the expense total')
+        return cents
+    raise ValueError(f'unknown split mode: {mode!r} (expected one of {", ".join(MODES)})')
+
+def allocate(totals, counts, weights) -> np.ndarray:
+    # Largest-remainder apportionment of each total over its weights. Integer
+    # weights are exact; float weights are rounded in float64.
+    totals = np.asarray(totals, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    weights = np.asarray(weights)
+    weight_sums = _group_sums(weights, counts)
+    if (weight_sums <= 0).any():
+        raise ValueError('split weights must add up to more than zero for each expense')
+
+    total_rep = np.repeat(totals, counts)
+    sum_rep = np.repeat(weight_sums, counts)
+    if np.issubdtype(weights.dtype, np.integer):
+        base, frac = np.divmod(total_rep * weights, sum_rep)
+    else:
+        exact = total_rep * (weights / sum_rep)
+        base = np.floor(exact).astype(np.int64)
+        frac = exact - base
+
+    leftover = totals - _group_sums(base, counts)
+    starts = np.cumsum(counts) - counts
+    owner = np.repeat(np.arange(totals.size), counts)
+    position = np.arange(owner.size) - starts[owner]
+    # Within each expense: largest fraction first, then earliest participant
+    order = np.lexsort((position, -frac, owner))
+    rank = np.empty_like(position)
+    rank[order] = position
+    return base + (rank < leftover[owner])
+
+def _group_sums(values, counts) -> np.ndarray:
+    if not counts.size:
+        return np.zeros(0, dtype=values.dtype)
+    return np.add.reduceat(values, np.cumsum(counts) - counts)
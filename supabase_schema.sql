@@ -1,8 +1,19 @@
 -- Run this in Supabase SQL editor
 
+-- groups: one row per team. Every ledger row belongs to exactly one group;
+-- group 1 ("Default") holds the rows of databases created before groups.
+create table if not exists groups (
+  id bigint generated by default as identity primary key,
+  name text not null unique,
+  created_at timestamptz default now()
+);
+insert into groups (id, name) values (1, 'Default') on conflict (id) do nothing;
+select setval(pg_get_serial_sequence('groups', 'id'), greatest((select max(id) from groups), 1));
+
+-- member names are unique within a group (see uq_members_group_name)
 create table if not exists members (
   id bigint generated always as identity primary key,
-  name text not null unique
+  name text not null
 );
 
 create table if not exists expenses (
@@ -24,3 +35,467 @@ create table if not exists transactions (
 
 create index if not exists idx_transactions_expense on transactions(expense_id);
 create index if not exists idx_expenses_payer on expenses(payer_id);
+
+-- group_id on every ledger table (transactions carry it too so a group's rows
+-- can be read without a join). Existing rows default into group 1.
+alter table members add column if not exists group_id bigint not null default 1 references groups(id) on delete cascade;
+alter table expenses add column if not exists group_id bigint not null default 1 references groups(id) on delete cascade;
+alter table transactions add column if not exists group_id bigint not null default 1 references groups(id) on delete cascade;
+alter table members drop constraint if exists members_name_key;
+
+-- Every read pages a single group in id order, so lead each index with group_id
+create unique index if not exists uq_members_group_name on members(group_id, name);
+create index if not exists idx_members_group on members(group_id, id);
+create index if not exists idx_expenses_group on expenses(group_id, id);
+create index if not exists idx_expenses_group_created_at on expenses(group_id, created_at);
+create index if not exists idx_expenses_group_payer on expenses(group_id, payer_id);
+create index if not exists idx_transactions_group on transactions(group_id, id);
+create index if not exists idx_transactions_group_member on transactions(group_id, member_id);
+
+-- balance_snapshots: checkpointed per-member balances covering every expense
+-- with id <= as_of_expense_id (and its transactions). Balances are then the
+-- latest checkpoint plus the tail of newer expenses.
+create table if not exists balance_snapshots (
+  id bigint generated always as identity primary key,
+  as_of_expense_id bigint not null,
+  member_id bigint not null references members(id) on delete cascade,
+  balance numeric not null,
+  created_at timestamptz default now(),
+  unique (as_of_expense_id, member_id)
+);
+alter table balance_snapshots add column if not exists group_id bigint not null default 1 references groups(id) on delete cascade;
+create index if not exists idx_balance_snapshots_group on balance_snapshots(group_id, as_of_expense_id);
+
+-- member_balances: per group, latest checkpoint + (paid - owed) over expenses after it
+create or replace view member_balances as
+with cp as (
+  select g.id as group_id, coalesce(max(s.as_of_expense_id), 0) as as_of
+  from groups g
+  left join balance_snapshots s on s.group_id = g.id
+  group by g.id
+)
+select
+  m.id as member_id,
+  m.name,
+  coalesce(s.balance, 0) + coalesce(p.paid, 0) - coalesce(o.owed, 0) as balance,
+  m.group_id
+from members m
+join cp on cp.group_id = m.group_id
+left join balance_snapshots s on s.member_id = m.id and s.as_of_expense_id = cp.as_of
+left join (
+  select e.payer_id, sum(e.amount) as paid
+  from expenses e join cp on cp.group_id = e.group_id
+  where e.id > cp.as_of group by e.payer_id
+) p on p.payer_id = m.id
+left join (
+  select t.member_id, sum(t.amount) as owed
+  from transactions t join cp on cp.group_id = t.group_id
+  where t.expense_id > cp.as_of group by t.member_id
+) o on o.member_id = m.id;
+
+-- called from utils.compute_balances via supabase.rpc('get_member_balances').
+-- Same sums as member_balances, with the group filter applied inside each
+-- aggregate so only that group's rows are read.
+drop function if exists get_member_balances();
+create or replace function get_member_balances(p_group_id bigint default 1)
+returns table (member_id bigint, name text, balance numeric)
+language sql stable
+as $$
+  with cp as (
+    select coalesce(max(as_of_expense_id), 0) as as_of from balance_snapshots where group_id = p_group_id
+  )
+  select
+    m.id,
+    m.name,
+    round(coalesce(s.balance, 0) + coalesce(p.paid, 0) - coalesce(o.owed, 0), 2)
+  from members m
+  cross join cp
+  left join balance_snapshots s on s.member_id = m.id and s.as_of_expense_id = cp.as_of
+  left join (
+    select payer_id, sum(amount) as paid from expenses, cp
+    where group_id = p_group_id and id > cp.as_of group by payer_id
+  ) p on p.payer_id = m.id
+  left join (
+    select member_id, sum(amount) as owed from transactions, cp
+    where group_id = p_group_id and expense_id > cp.as_of group by member_id
+  ) o on o.member_id = m.id
+  where m.group_id = p_group_id
+  order by m.id;
+$$;
+
+-- create_expenses: insert a batch of expenses and their participant rows in one transaction.
+-- payload is a JSON array of
+--   {"group_id", "payer_id", "amount", "title", "description", "created_at" (optional),
+--    "shares": [{"member_id", "amount"}, ...]}
+create or replace function create_expenses(payload jsonb)
+returns table (expense_id bigint)
+language plpgsql
+as $$
+#variable_conflict use_column
+declare
+  item jsonb;
+  new_id bigint;
+  gid bigint;
+begin
+  for item in select value from jsonb_array_elements(payload) loop
+    gid := coalesce((item->>'group_id')::bigint, 1);
+    insert into expenses (group_id, title, payer_id, amount, description, created_at)
+    values (
+      gid,
+      item->>'title',
+      (item->>'payer_id')::bigint,
+      (item->>'amount')::numeric,
+      item->>'description',
+      coalesce((item->>'created_at')::timestamptz, now())
+    )
+    returning id into new_id;
+
+    insert into transactions (group_id, expense_id, member_id, amount)
+    select gid, new_id, (s->>'member_id')::bigint, (s->>'amount')::numeric
+    from jsonb_array_elements(item->'shares') as s;
+
+    expense_id := new_id;
+    return next;
+  end loop;
+end;
+$$;
+
+-- ledger_tombstones: one row per deleted ledger row so clients mirroring the
+-- tables can sync deletions incrementally (row_id null = table was truncated)
+create table if not exists ledger_tombstones (
+  id bigint generated always as identity primary key,
+  table_name text not null,
+  row_id bigint,
+  deleted_at timestamptz default now()
+);
+-- group of the deleted row, so each group's mirror replays only its own
+-- deletions; truncates have no group and are read by every group's mirror
+alter table ledger_tombstones add column if not exists group_id bigint;
+create index if not exists idx_ledger_tombstones_group on ledger_tombstones(group_id, id);
+
+create or replace function record_tombstone()
+returns trigger
+language plpgsql
+as $$
+begin
+  if tg_op = 'TRUNCATE' then
+    insert into ledger_tombstones (table_name, row_id) values (tg_table_name, null);
+    return null;
+  end if;
+  insert into ledger_tombstones (table_name, row_id, group_id) values (tg_table_name, old.id, old.group_id);
+  return old;
+end;
+$$;
+
+drop trigger if exists members_tombstone on members;
+create trigger members_tombstone after delete on members
+  for each row execute function record_tombstone();
+drop trigger if exists expenses_tombstone on expenses;
+create trigger expenses_tombstone after delete on expenses
+  for each row execute function record_tombstone();
+drop trigger if exists transactions_tombstone on transactions;
+create trigger transactions_tombstone after delete on transactions
+  for each row execute function record_tombstone();
+
+drop trigger if exists members_truncate_tombstone on members;
+create trigger members_truncate_tombstone after truncate on members
+  for each statement execute function record_tombstone();
+drop trigger if exists expenses_truncate_tombstone on expenses;
+create trigger expenses_truncate_tombstone after truncate on expenses
+  for each statement execute function record_tombstone();
+drop trigger if exists transactions_truncate_tombstone on transactions;
+create trigger transactions_truncate_tombstone after truncate on transactions
+  for each statement execute function record_tombstone();
+
+-- Every expenses read is filtered by group, so idx_expenses_group_created_at
+-- serves the date filters; the old global created_at index only costs writes
+drop index if exists idx_expenses_created_at;
+
+-- create_balance_snapshot: checkpoint every member's balance in a group as
+-- of the group's newest expense by full replay; returns that expense id
+drop function if exists create_balance_snapshot();
+create or replace function create_balance_snapshot(p_group_id bigint default 1)
+returns bigint
+language plpgsql
+as $$
+declare
+  cutoff bigint;
+begin
+  select coalesce(max(id), 0) into cutoff from expenses where group_id = p_group_id;
+  delete from balance_snapshots where group_id = p_group_id and as_of_expense_id = cutoff;
+  insert into balance_snapshots (group_id, as_of_expense_id, member_id, balance)
+  select
+    p_group_id,
+    cutoff,
+    m.id,
+    coalesce((select sum(e.amount) from expenses e where e.payer_id = m.id and e.id <= cutoff), 0)
+      - coalesce((select sum(t.amount) from transactions t where t.member_id = m.id and t.expense_id <= cutoff), 0)
+  from members m
+  where m.group_id = p_group_id;
+  return cutoff;
+end;
+$$;
+
+-- deleting an expense a checkpoint already covers makes that checkpoint wrong
+create or replace function drop_stale_snapshots()
+returns trigger
+language plpgsql
+as $$
+begin
+  delete from balance_snapshots where group_id = old.group_id and as_of_expense_id >= old.id;
+  return old;
+end;
+$$;
+
+drop trigger if exists expenses_drop_snapshots on expenses;
+create trigger expenses_drop_snapshots after delete on expenses
+  for each row execute function drop_stale_snapshots();
+
+-- delete_expenses: delete a set of a group's expenses in one transaction;
+-- their transactions go with them through on delete cascade
+create or replace function delete_expenses(p_group_id bigint, p_expense_ids bigint[])
+returns table (expense_id bigint)
+language sql
+as $$
+  delete from expenses where group_id = p_group_id and id = any(p_expense_ids) returning id;
+$$;
+
+-- flush_group: delete everything a group owns in one transaction (one round
+-- trip instead of a filtered DELETE per table).
+create or replace function flush_group(p_group_id bigint default 1)
+returns void
+language plpgsql
+as $$
+begin
+  delete from balance_snapshots where group_id = p_group_id;
+  delete from transactions where group_id = p_group_id;
+  delete from expenses where group_id = p_group_id;
+  -- the delete triggers have emptied the rollups by now; clear any leftovers
+  delete from spending_rollups where group_id = p_group_id;
+  delete from title_rollups where group_id = p_group_id;
+  delete from members where group_id = p_group_id;
+end;
+$$;
+
+-- An earlier version shipped flush_ledger(), an RPC that truncated every
+-- group and was callable with the anon key. Nothing uses it; remove it.
+drop function if exists flush_ledger();
+
+-- Member statements read one member's rows only: the expenses they paid and
+-- the shares they owe, each through an index led by (group_id, member) that
+-- also covers the amount. They supersede the older (group_id, payer_id),
+-- (group_id, member_id) and (member_id) indexes, dropped here.
+-- idx_expenses_group_created_at stays: History and export date filters use it.
+create index if not exists idx_expenses_group_payer_created on expenses(group_id, payer_id, created_at, id) include (amount);
+create index if not exists idx_transactions_group_member_expense on transactions(group_id, member_id, expense_id) include (amount);
+drop index if exists idx_expenses_group_payer;
+drop index if exists idx_transactions_group_member;
+drop index if exists idx_transactions_member;
+
+-- member_statement: one line per expense a member paid for or took part in,
+-- oldest first, with paid (credit), owed (debit) and the running balance
+-- after that line. The window runs over all of the member's earlier lines,
+-- so the first line in [p_start, p_end) carries the opening balance with it.
+create or replace function member_statement(
+  p_group_id bigint,
+  p_member_id bigint,
+  p_start timestamptz default null,
+  p_end timestamptz default null
+)
+returns table (
+  expense_id bigint,
+  created_at timestamptz,
+  title text,
+  payer_id bigint,
+  paid numeric,
+  owed numeric,
+  running_balance numeric
+)
+language sql stable
+as $$
+  with activity as (
+    select id as expense_id, amount as paid, 0::numeric as owed
+    from expenses where group_id = p_group_id and payer_id = p_member_id
+    union all
+    select expense_id, 0, amount
+    from transactions where group_id = p_group_id and member_id = p_member_id
+  ),
+  lines as (
+    select
+      e.id, e.created_at, e.title, e.payer_id,
+      sum(a.paid) as paid,
+      sum(a.owed) as owed
+    from activity a
+    join expenses e on e.id = a.expense_id
+    where p_end is null or e.created_at < p_end
+    group by e.id
+  ),
+  running as (
+    select
+      l.*,
+      sum(l.paid - l.owed) over (order by l.created_at, l.id rows unbounded preceding) as running_balance
+    from lines l
+  )
+  select id, created_at, title, payer_id, round(paid, 2), round(owed, 2), round(running_balance, 2)
+  from running
+  where p_start is null or created_at >= p_start
+  order by created_at, id;
+$$;
+
+-- Spending rollups for the Analytics tab: per (month, member) totals paid and
+-- owed, and per (month, title) spend. Triggers keep them current on every
+-- expense/transaction insert and delete, so dashboards read a few rows per
+-- month instead of scanning the history. Months are UTC. rollups.py is the
+-- in-Python equivalent (Guest Mode).
+create table if not exists spending_rollups (
+  id bigint generated always as identity primary key,
+  group_id bigint not null references groups(id) on delete cascade,
+  month date not null,
+  member_id bigint not null references members(id) on delete cascade,
+  paid numeric not null default 0,
+  owed numeric not null default 0,
+  paid_count integer not null default 0,
+  shared_count integer not null default 0,
+  unique (group_id, month, member_id)
+);
+
+create table if not exists title_rollups (
+  id bigint generated always as identity primary key,
+  group_id bigint not null references groups(id) on delete cascade,
+  month date not null,
+  title text not null,
+  amount numeric not null default 0,
+  expenses integer not null default 0,
+  unique (group_id, month, title)
+);
+
+create or replace function bump_spending_rollup(
+  p_group_id bigint, p_month date, p_member_id bigint,
+  p_paid numeric, p_owed numeric, p_paid_count integer, p_shared_count integer
+)
+returns void
+language plpgsql
+as $$
+begin
+  insert into spending_rollups as r (group_id, month, member_id, paid, owed, paid_count, shared_count)
+  values (p_group_id, p_month, p_member_id, p_paid, p_owed, p_paid_count, p_shared_count)
+  on conflict (group_id, month, member_id) do update set
+    paid = r.paid + excluded.paid,
+    owed = r.owed + excluded.owed,
+    paid_count = r.paid_count + excluded.paid_count,
+    shared_count = r.shared_count + excluded.shared_count;
+  delete from spending_rollups
+  where group_id = p_group_id and month = p_month and member_id = p_member_id
+    and paid_count = 0 and shared_count = 0;
+end;
+$$;
+
+create or replace function bump_title_rollup(p_group_id bigint, p_month date, p_title text, p_amount numeric, p_expenses integer)
+returns void
+language plpgsql
+as $$
+begin
+  insert into title_rollups as r (group_id, month, title, amount, expenses)
+  values (p_group_id, p_month, coalesce(p_title, ''), p_amount, p_expenses)
+  on conflict (group_id, month, title) do update set
+    amount = r.amount + excluded.amount,
+    expenses = r.expenses + excluded.expenses;
+  delete from title_rollups
+  where group_id = p_group_id and month = p_month and title = coalesce(p_title, '') and expenses = 0;
+end;
+$$;
+
+-- Expenses: added after insert; removed before delete, while the expense's
+-- transactions still exist, together with their owed shares (the cascade
+-- that follows finds the expense gone and skips them)
+create or replace function rollup_expense()
+returns trigger
+language plpgsql
+as $$
+declare
+  e expenses;
+  direction integer;
+  bucket date;
+  t record;
+begin
+  if tg_op = 'INSERT' then
+    e := new; direction := 1;
+  else
+    e := old; direction := -1;
+  end if;
+  bucket := date_trunc('month', e.created_at at time zone 'UTC')::date;
+  perform bump_spending_rollup(e.group_id, bucket, e.payer_id, direction * e.amount, 0, direction, 0);
+  perform bump_title_rollup(e.group_id, bucket, e.title, direction * e.amount, direction);
+  if tg_op = 'DELETE' then
+    for t in select member_id, amount from transactions where expense_id = e.id loop
+      perform bump_spending_rollup(e.group_id, bucket, t.member_id, 0, -t.amount, 0, -1);
+    end loop;
+    return old;
+  end if;
+  return new;
+end;
+$$;
+
+create or replace function rollup_transaction()
+returns trigger
+language plpgsql
+as $$
+declare
+  t transactions;
+  direction integer;
+  created timestamptz;
+begin
+  if tg_op = 'INSERT' then
+    t := new; direction := 1;
+  else
+    t := old; direction := -1;
+  end if;
+  select created_at into created from expenses where id = t.expense_id;
+  if found then
+    perform bump_spending_rollup(
+      t.group_id, date_trunc('month', created at time zone 'UTC')::date, t.member_id, 0, direction * t.amount, 0, direction
+    );
+  end if;
+  return null;
+end;
+$$;
+
+drop trigger if exists expenses_rollup_insert on expenses;
+create trigger expenses_rollup_insert after insert on expenses
+  for each row execute function rollup_expense();
+drop trigger if exists expenses_rollup_delete on expenses;
+create trigger expenses_rollup_delete before delete on expenses
+  for each row execute function rollup_expense();
+drop trigger if exists transactions_rollup on transactions;
+create trigger transactions_rollup after insert or delete on transactions
+  for each row execute function rollup_transaction();
+
+-- rebuild_spending_rollups: recompute a group's rollups from the ledger (for
+-- existing data and as a repair tool)
+create or replace function rebuild_spending_rollups(p_group_id bigint default 1)
+returns void
+language plpgsql
+as $$
+begin
+  delete from spending_rollups where group_id = p_group_id;
+  delete from title_rollups where group_id = p_group_id;
+  insert into spending_rollups (group_id, month, member_id, paid, owed, paid_count, shared_count)
+  select p_group_id, month, member_id, sum(paid), sum(owed), sum(paid_count)::integer, sum(shared_count)::integer
+  from (
+    select date_trunc('month', created_at at time zone 'UTC')::date as month, payer_id as member_id,
+           amount as paid, 0 as owed, 1 as paid_count, 0 as shared_count
+    from expenses where group_id = p_group_id
+    union all
+    select date_trunc('month', e.created_at at time zone 'UTC')::date, t.member_id, 0, t.amount, 0, 1
+    from transactions t join expenses e on e.id = t.expense_id
+    where t.group_id = p_group_id
+  ) lines
+  group by month, member_id;
+  insert into title_rollups (group_id, month, title, amount, expenses)
+  select p_group_id, date_trunc('month', created_at at time zone 'UTC')::date, coalesce(title, ''), sum(amount), count(*)
+  from expenses where group_id = p_group_id
+  group by 1, 2, 3;
+end;
+$$;
+
+select rebuild_spending_rollups(id) from groups;
@@ -0,0 +1,142 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from postgrest.exceptions import APIError
+from supabase import Client
+
+import ledger
+
+# Local mirror of members/expenses/transactions kept current by delta reads:
+# each refresh fetches only rows with id above the table's high-water mark,
+# applies deletions recorded in ledger_tombstones, and updates a per-member
+# balance vector (int cents) as rows come and go.
+#
+# Identity ids are assigned before commit, so two writers committing out of
+# order could slip a row in under the watermark. The office app has a single
+# writer per action, but as a backstop the mirror reloads in full every
+# FULL_RESYNC_SECONDS.
+TABLES = ('members', 'expenses', 'transactions')
+FULL_RESYNC_SECONDS = 3600.0
+
+_pool = ThreadPoolExecutor(max_workers=len(TABLES) + 1, thread_name_prefix='ledger-sync')
+
+class LedgerMirror:
+    def __init__(self, pager: Callable):
+        # pager(supabase, table, after_id=...) yields rows in id order (utils.iter_table)
+        self._pager = pager
+        self._lock = threading.Lock()
+        self.stats = {'refreshes': 0, 'full_loads': 0, 'rows_fetched': 0, 'rows_deleted': 0}
+        self.tombstones_available = True
+        self.reset()
+
+    def reset(self):
+        self.rows: Dict[str, Dict[int, dict]] = {t: {} for t in TABLES}
+        self.watermarks = {t: 0 for t in TABLES}
+        self.expenses_created_at: Optional[str] = None
+        self.tombstone_mark: Optional[int] = None
+        self.balances: Dict[int, int] = {}
+        self.loaded_at: Optional[float] = None
+
+    def rows_deleted(self):
+        # Called after local deletes. With tombstones the next refresh replays
+        # them; without, the only safe option is a full reload.
+        if not self.tombstones_available:
+            with self._lock:
+                self.reset()
+
+    # ---------- Reads ----------
+    def table_rows(self, table: str) -> list:
+        return list(self.rows[table].values())
+
+    def balance_of(self, member_id: int) -> int:
+        return self.balances.get(member_id, 0)
+
+    # ---------- Refresh ----------
+    def refresh(self, supabase: Client):
+        with self._lock:
+            self.stats['refreshes'] += 1
+            if self.loaded_at is None or time.monotonic() - self.loaded_at > FULL_RESYNC_SECONDS:
+                self.reset()
+            self._sync(supabase)
+
+    def _sync(self, supabase: Client):
+        if self.loaded_at is None:
+            self.stats['full_loads'] += 1
+            self.loaded_at = time.monotonic()
+            if self.tombstone_mark is None:
+                # Start the tombstone watermark before the first load so deletions
+                # racing with it are replayed on the next refresh
+                self.tombstone_mark = self._latest_tombstone(supabase)
+
+        ctx = contextvars.copy_context
+        futures = {
+            t: _pool.submit(ctx().run, lambda t=t: list(self._pager(supabase, t, after_id=self.watermarks[t] or None)))
+            for t in TABLES
+        }
+        tombstones = _pool.submit(ctx().run, self._new_tombstones, supabase)
+        for t in TABLES:
+            self._apply_new(t, futures[t].result())
+
+        for tomb in tombstones.result() or ():
+            if tomb['row_id'] is None:
+                # A table was truncated: drop everything and load again
+                self.reset()
+                self.tombstone_mark = tomb['id']
+                self._sync(supabase)
+                return
+            self._apply_delete(tomb['table_name'], tomb['row_id'])
+            self.tombstone_mark = tomb['id']
+
+    def _latest_tombstone(self, supabase: Client) -> int:
+        try:
+            rows = supabase.table('ledger_tombstones').select('id').order('id', desc=True).limit(1).execute().data
+        except APIError:
+            self.tombstones_available = False
+            return 0
+        self.tombstones_available = True
+        return rows[0]['id'] if rows else 0
+
+    def _new_tombstones(self, supabase: Client):
+        try:
+            return list(self._pager(supabase, 'ledger_tombstones', after_id=self.tombstone_mark or None))
+        except APIError:
+            # Schema without tombstones: local deletes force a reload instead
+            self.tombstones_available = False
+            return None
+
+    def _apply_new(self, table: str, rows: list):
+        if not rows:
+            return
+        store = self.rows[table]
+        for r in rows:
+            store[r['id']] = r
+        self.watermarks[table] = max(self.watermarks[table], rows[-1]['id'])
+        self.stats['rows_fetched'] += len(rows)
+
+        if table == 'members':
+            for r in rows:
+                self.balances.setdefault(r['id'], 0)
+        elif table == 'expenses':
+            for r, cents in zip(rows, ledger.to_cents_array([r['amount'] for r in rows]).tolist()):
+                self.balances[r['payer_id']] = self.balances.get(r['payer_id'], 0) + cents
+            latest = max((r['created_at'] for r in rows if r.get('created_at')), default=None)
+            if latest and (self.expenses_created_at is None or latest > self.expenses_created_at):
+                self.expenses_created_at = latest
+        else:
+            for r, cents in zip(rows, ledger.to_cents_array([r['amount'] for r in rows]).tolist()):
+                self.balances[r['member_id']] = self.balances.get(r['member_id'], 0) - cents
+
+    def _apply_delete(self, table: str, row_id: int):
+        row = self.rows.get(table, {}).pop(row_id, None)
+        if row is None:
+            return
+        self.stats['rows_deleted'] += 1
+        if table == 'members':
+            self.balances.pop(row_id, None)
+        elif table == 'expenses':
+            self.balances[row['payer_id']] = self.balances.get(row['payer_id'], 0) - ledger.to_cents(row['amount'])
+        elif table == 'transactions':
+            self.balances[row['member_id']] = self.balances.get(row['member_id'], 0) + ledger.to_cents(row['amount'])
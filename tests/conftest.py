@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils  # noqa: E402
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    # Mirrors and snapshots are process-wide; every test starts cold
+    utils._mirrors.clear()
+    utils.invalidate_cache()
+    yield
+    utils._mirrors.clear()
+    utils.invalidate_cache()
@@ -0,0 +1,44 @@
+import pytest
+
+from benchmarks.fake_supabase import FakeClient
+from benchmarks.synthetic import generate_office
+import utils
+
+SOURCES = ('mirror', 'rpc', 'checkpoint')
+
+@pytest.fixture
+def client():
+    return FakeClient(generate_office(15, 300, 4, seed=5))
+
+def balances(client, source):
+    utils.invalidate_cache()
+    return utils.compute_balances(client, source=source)['balance_cents'].tolist()
+
+def assert_sources_agree(client):
+    expected = balances(client, 'rpc')
+    for source in SOURCES:
+        assert balances(client, source) == expected, source
+
+def test_sources_agree(client):
+    assert_sources_agree(client)
+
+def test_checkpoint_plus_tail(client):
+    assert utils.create_balance_checkpoint(client) == 300
+    members = utils.fetch_members(client)['id'].tolist()
+    utils.create_expense_with_transactions(client, members[0], 99.99, 'After checkpoint', '', members[:4])
+    assert_sources_agree(client)
+    assert utils.verify_checkpoint(client)['ok']
+
+def test_deleting_a_checkpointed_expense_drops_the_checkpoint(client):
+    utils.create_balance_checkpoint(client)
+    utils.delete_expenses(client, [10, 250])
+    assert not client.tables['balance_snapshots']
+    assert_sources_agree(client)
+
+def test_older_checkpoints_survive_later_deletes(client):
+    utils.create_balance_checkpoint(client)
+    members = utils.fetch_members(client)['id'].tolist()
+    new_id = utils.create_expense_with_transactions(client, members[1], 10, 'Late', '', members[:2])
+    utils.delete_expense(client, new_id)
+    assert {s['as_of_expense_id'] for s in client.tables['balance_snapshots']} == {300}
+    assert_sources_agree(client)
@@ -0,0 +1,63 @@
+import datetime
+import io
+
+import pytest
+
+from benchmarks.fake_supabase import FakeClient
+from benchmarks.synthetic import generate_office
+import export
+import importer
+import utils
+
+# Views that should cost what they show, not the size of the ledger: on a
+# cold process none of them may pull expenses/transactions wholesale.
+
+@pytest.fixture(scope='module')
+def client():
+    return FakeClient(generate_office(30, 5000, 5, seed=1))
+
+def cold_rows(client, read):
+    utils._mirrors.clear()
+    utils.invalidate_cache()
+    client.reset_counters()
+    result = read()
+    return result, sum(c['rows'] for c in client.calls), {c['target'] for c in client.calls}
+
+def test_history_page_reads_only_members_and_the_page(client):
+    (page, total), rows, targets = cold_rows(client, lambda: utils.fetch_history_page(client, 0))
+    assert total == 5000 and page['expense_id'].nunique() == utils.HISTORY_PAGE_SIZE
+    assert rows <= 30 + utils.HISTORY_PAGE_SIZE * 6
+    assert not utils._mirror_for(1).stats['full_loads']
+
+def test_member_statement_reads_only_that_member(client):
+    member = 3
+    own = sum(1 for e in client.tables['expenses'] if e['payer_id'] == member)
+    own += sum(1 for t in client.tables['transactions'] if t['member_id'] == member)
+    statement, rows, targets = cold_rows(client, lambda: utils.fetch_member_statement(client, member))
+    assert len(statement) and targets == {'members', 'rpc:member_statement'}
+    assert rows <= 30 + own
+
+def test_rollups_read_only_rollup_rows(client):
+    roll, rows, targets = cold_rows(client, lambda: utils.fetch_rollups(client))
+    assert not roll['members'].empty and not roll['titles'].empty
+    assert targets == {'members', 'spending_rollups', 'title_rollups'}
+    assert rows == 30 + len(roll['members']) + len(roll['titles'])
+
+def test_export_reads_only_members_and_the_exported_pages(client):
+    days = sorted({e['created_at'][:10] for e in client.tables['expenses']})
+    start = end = datetime.date.fromisoformat(days[1])
+    in_range = [e['id'] for e in client.tables['expenses'] if e['created_at'][:10] == days[1]]
+    shares = sum(1 for t in client.tables['transactions'] if t['expense_id'] in set(in_range))
+
+    exported, rows, targets = cold_rows(client, lambda: list(export.iter_history_rows(client, start=start, end=end)))
+    assert len(exported) == shares
+    assert targets == {'members', 'expenses', 'transactions'}
+    assert rows == 30 + len(in_range) + shares
+    assert not utils._mirror_for(1).stats['full_loads']
+
+def test_import_reads_only_members(client):
+    csv = "title,amount,payer,participants\nCoffee,4.50,Member 00001,Member 00001;Member 00002\n"
+    report, rows, targets = cold_rows(client, lambda: importer.import_expenses(client, io.StringIO(csv)))
+    assert len(report['created']) == 1
+    assert targets == {'members', 'rpc:create_expenses'}
+    assert rows == 30 + 1
@@ -0,0 +1,39 @@
+import streamlit as st
+
+from benchmarks.fake_supabase import FakeClient
+from benchmarks.synthetic import generate_office
+import data_handlers
+import utils
+
+def setup_function():
+    data_handlers._snapshots.clear()
+
+def test_guest_client_never_publishes_session_data():
+    # One guest's private members must not become the process-wide snapshot
+    utils.create_member(None, 'Private guest member')
+    snap = data_handlers.shared_snapshot(None, utils, utils.DEFAULT_GROUP_ID)
+    assert snap.members == () and snap.history.empty and not snap.balances
+    assert utils.DEFAULT_GROUP_ID not in data_handlers._snapshots
+
+def test_database_snapshot_is_shared_per_group():
+    client = FakeClient(generate_office(8, 30, 3, seed=4))
+    first = data_handlers.shared_snapshot(client, utils, 1)
+    client.reset_counters()
+    assert data_handlers.shared_snapshot(client, utils, 1) is first
+    assert client.round_trips == 0
+    assert len(first.members) == 8 and len(first.history) == 90
+
+def test_guest_history_mutations_stay_private():
+    client = FakeClient(generate_office(6, 20, 3, seed=8))
+    for key in ('guest_snapshot', 'guest_overlay'):
+        st.session_state.pop(key, None)
+    handler = data_handlers.SessionStateDataHandler(client, utils)
+    shared = handler.snapshot.history
+    before = shared.copy(deep=True)
+
+    mine = handler.fetch_history()
+    assert mine is not shared
+    mine['note'] = 'mine'
+    mine.loc[mine.index[0], 'share'] = -1.0
+    mine.fillna({'description': 'x'}, inplace=True)
+    assert shared.equals(before) and 'note' not in shared.columns
@@ -0,0 +1,75 @@
+from collections import defaultdict
+
+import pandas as pd
+import pytest
+
+from benchmarks.fake_supabase import FakeClient
+from benchmarks.synthetic import generate_office
+import utils
+
+def old_fetch_history(members, expenses, transactions, by_expense=None):
+    # The original builder: a list of row dicts, each expense scanning every
+    # transaction. `by_expense` swaps only the scan for a lookup with the same
+    # order (the comprehension keeps transaction order), for large ledgers.
+    members = {m['id']: m['name'] for m in members}
+    rows = []
+    for e in expenses:
+        if by_expense is None:
+            e_trans = [t for t in transactions if t['expense_id'] == e['id']]
+        else:
+            e_trans = by_expense.get(e['id'], [])
+        for t in e_trans:
+            rows.append({
+                'expense_id': e['id'],
+                'date': e.get('created_at'),
+                'title': e.get('title'),
+                'payer': members.get(e.get('payer_id')),
+                'member': members.get(t.get('member_id')),
+                'share': t.get('amount'),
+                'total_amount': e.get('amount'),
+                'description': e.get('description')
+            })
+    if not rows:
+        return pd.DataFrame(columns=[
+            'expense_id', 'date', 'title', 'payer', 'member', 'share', 'total_amount', 'description'
+        ])
+    return pd.DataFrame(rows)
+
+def assert_same_history(old: pd.DataFrame, new: pd.DataFrame):
+    # Same columns in the same order, same rows in the same order; dtypes may
+    # differ (the new frame is compact), values may not
+    assert list(new.columns) == list(old.columns) == utils.HISTORY_COLUMNS
+    assert len(new) == len(old)
+    assert new['expense_id'].tolist() == old['expense_id'].tolist()
+    assert new['date'].tolist() == pd.to_datetime(old['date'], utc=True, format='ISO8601').tolist()
+    for column in ('title', 'payer', 'member', 'description'):
+        assert new[column].astype(object).tolist() == old[column].tolist(), column
+    for column in ('share', 'total_amount'):
+        assert new[column].tolist() == old[column].astype(float).round(2).tolist(), column
+
+def _tables(data):
+    return data['members'], data['expenses'], data['transactions']
+
+def test_history_matches_nested_scan():
+    data = generate_office(12, 400, 4, seed=7)
+    assert_same_history(old_fetch_history(*_tables(data)), utils._build_history(*_tables(data)))
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_history_matches_on_100k_transactions(seed):
+    data = generate_office(200, 25_000, 4, seed=seed)
+    assert len(data['transactions']) == 100_000
+    by_expense = defaultdict(list)
+    for t in data['transactions']:
+        by_expense[t['expense_id']].append(t)
+    old = old_fetch_history(*_tables(data), by_expense=by_expense)
+    assert_same_history(old, utils.fetch_history(FakeClient(data)))
+
+def test_expense_without_transactions_is_skipped():
+    data = generate_office(5, 10, 2, seed=3)
+    data['transactions'] = [t for t in data['transactions'] if t['expense_id'] != 4]
+    new = utils._build_history(*_tables(data))
+    assert 4 not in new['expense_id'].tolist()
+    assert_same_history(old_fetch_history(*_tables(data)), new)
+
+def test_empty_history_keeps_columns():
+    assert list(utils._build_history([], [], []).columns) == utils.HISTORY_COLUMNS
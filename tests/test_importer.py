@@ -0,0 +1,59 @@
+import io
+
+import pandas as pd
+import pytest
+
+from benchmarks.fake_supabase import FakeClient
+import importer
+import utils
+
+CSV = """title,amount,payer,participants,date
+Lunch,30.00,Alice,Alice;Bob;Cara,2024-03-01
+Cab,12.5,Bob,,
+Broken date,10,Dan,Dan;Alice,not-a-date
+Broken amount,abc,Erin,Erin
+Too precise,1.234,Alice,Fay
+"""
+
+def member_names(client):
+    return sorted(utils.fetch_members(client)['name'].tolist())
+
+def test_rejected_rows_do_not_create_members():
+    client = FakeClient()
+    report = importer.import_expenses(client, io.StringIO(CSV), chunk_size=2)
+    assert report['rows'] == 5 and len(report['created']) == 2
+    assert report['errors']['row'].tolist() == [4, 5, 6]
+    # Dan, Erin and Fay appear only on rejected rows
+    assert member_names(client) == ['Alice', 'Bob', 'Cara']
+
+def test_import_splits_and_matches_names_case_insensitively():
+    client = FakeClient()
+    utils.create_member(client, 'alice')
+    report = importer.import_expenses(client, io.StringIO(CSV))
+    assert member_names(client) == ['Bob', 'Cara', 'alice']
+    balances = utils.compute_balances(client).set_index('name')['balance_cents'].to_dict()
+    # Lunch split three ways; the cab with no participants is Bob's alone
+    assert balances == {'alice': 2000, 'Bob': -1000, 'Cara': -1000}
+    assert len(report['created']) == 2
+
+def test_missing_columns_are_rejected():
+    with pytest.raises(ValueError):
+        importer.import_expenses(FakeClient(), io.StringIO("title,amount\nx,1\n"))
+
+def test_excel_upload(tmp_path):
+    pytest.importorskip('openpyxl')
+    path = tmp_path / 'expenses.xlsx'
+    pd.read_csv(io.StringIO(CSV), dtype=str, keep_default_na=False).to_excel(path, index=False)
+    client = FakeClient()
+    report = importer.import_expenses(client, str(path))
+    assert len(report['created']) == 2 and member_names(client) == ['Alice', 'Bob', 'Cara']
+
+def test_excel_sheet_is_read_once(tmp_path, monkeypatch):
+    pytest.importorskip('openpyxl')
+    path = tmp_path / 'expenses.xlsx'
+    pd.read_csv(io.StringIO(CSV), dtype=str, keep_default_na=False).to_excel(path, index=False)
+    calls = []
+    read_excel = pd.read_excel
+    monkeypatch.setattr(pd, 'read_excel', lambda *a, **k: calls.append(a) or read_excel(*a, **k))
+    report = importer.import_expenses(FakeClient(), str(path), chunk_size=2)
+    assert len(report['created']) == 2 and len(calls) == 1
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+import ledger
+import splits
+import utils
+
+SEEDS = range(20)
+
+def random_batch(rng, mode, n_expenses=200):
+    totals = rng.integers(0, 2_000_000, n_expenses)
+    counts = rng.integers(1, 12, n_expenses)
+    size = int(counts.sum())
+    # random weights with some zero-weight participants (never all of them)
+    weights = rng.integers(0, 6, size)
+    weights[np.cumsum(counts) - counts] += 1
+    if mode == 'equal':
+        values = None
+    elif mode == 'shares':
+        values = weights * rng.choice([1.0, 0.25], size)
+    elif mode == 'percent':
+        values = splits.allocate(np.full(n_expenses, 10_000), counts, weights) / 100
+    else:
+        values = splits.allocate(totals, counts, weights)
+    return totals, counts, values
+
+def exact_shares(totals, counts, mode, values):
+    weights = np.ones(int(counts.sum())) if values is None else np.asarray(values, dtype=np.float64)
+    starts = np.cumsum(counts) - counts
+    return np.repeat(totals, counts) * weights / np.repeat(np.add.reduceat(weights, starts), counts)
+
+@pytest.mark.parametrize('mode', splits.MODES)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_split_properties(mode, seed):
+    rng = np.random.default_rng(seed)
+    totals, counts, values = random_batch(rng, mode)
+    shares = splits.split_batch(totals, counts, mode, values)
+
+    assert shares.dtype == np.int64 and shares.shape == (counts.sum(),)
+    assert (np.add.reduceat(shares, np.cumsum(counts) - counts) == totals).all()
+    assert (shares >= 0).all()
+    assert (np.abs(shares - exact_shares(totals, counts, mode, values)) < 1 + 1e-9).all()
+
+def test_equal_split_gives_extra_cents_to_first_participants():
+    assert splits.split(100, 3).tolist() == [34, 33, 33]
+    assert splits.split_batch([5, 7], [2, 3]).tolist() == [3, 2, 3, 2, 2]
+
+def test_zero_weight_participants_get_nothing():
+    assert splits.split(1000, 3, 'shares', [0, 1, 3]).tolist() == [0, 250, 750]
+    assert splits.split(999, 3, 'percent', [0, 50, 50]).tolist() == [0, 500, 499]
+
+def test_all_zero_weights_are_rejected():
+    with pytest.raises(ValueError):
+        splits.split(1000, 2, 'shares', [0, 0])
+
+@pytest.mark.parametrize('mode, values', [
+    ('percent', [50, 49.99]),
+    ('percent', [60, 50]),
+    ('percent', [-10, 110]),
+    ('exact', [500, 499]),
+    ('exact', [1200, -200]),
+    ('shares', [-1, 2]),
+])
+def test_inconsistent_values_are_rejected(mode, values):
+    with pytest.raises(ValueError):
+        splits.split(1000, 2, mode, values)
+
+def test_missing_or_misshaped_values_are_rejected():
+    with pytest.raises(ValueError):
+        splits.split(1000, 2, 'shares')
+    with pytest.raises(ValueError):
+        splits.split(1000, 2, 'shares', [1, 2, 3])
+    with pytest.raises(ValueError):
+        splits.split(1000, 2, 'thirds', [1, 2])
+    with pytest.raises(ValueError):
+        splits.split_batch([1000], [0])
+
+def test_mixed_mode_batch_through_batch_shares():
+    expenses = [
+        {'amount': 100, 'participant_ids': [1, 2, 3]},
+        {'amount': 90, 'participant_ids': [1, 2], 'split_mode': 'shares', 'split_values': [2, 1]},
+        {'amount': 10, 'participant_ids': [1, 2, 3], 'split_mode': 'percent', 'split_values': [50, 25, 25]},
+        {'amount': 12.5, 'participant_ids': [2, 3], 'split_mode': 'exact', 'split_values': [10, 2.5]},
+        {'amount': 7, 'participant_ids': [4], 'shares': [7.0]},
+        {'amount': 0.01, 'participant_ids': [1, 2], 'split_mode': 'equal'},
+    ]
+    assert utils._batch_shares(expenses) == [
+        [33.34, 33.33, 33.33],
+        [60.0, 30.0],
+        [5.0, 2.5, 2.5],
+        [10.0, 2.5],
+        [7.0],
+        [0.01, 0.0],
+    ]
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_mixed_mode_batch_matches_per_expense_splits(seed):
+    rng = np.random.default_rng(seed)
+    expenses = []
+    for _ in range(60):
+        n = int(rng.integers(1, 7))
+        mode = str(rng.choice(splits.MODES))
+        amount = int(rng.integers(1, 100_000)) / 100
+        values = None
+        if mode == 'shares':
+            values = rng.integers(1, 5, n).tolist()
+        elif mode == 'percent':
+            values = (splits.allocate([10_000], [n], rng.integers(1, 9, n)) / 100).tolist()
+        elif mode == 'exact':
+            values = ledger.from_cents(splits.allocate([ledger.to_cents(amount)], [n], rng.integers(1, 9, n))).tolist()
+        expenses.append({
+            'amount': amount, 'participant_ids': list(range(1, n + 1)), 'split_mode': mode, 'split_values': values,
+        })
+    batch = utils._batch_shares(expenses)
+    for e, shares in zip(expenses, batch):
+        assert shares == utils._split_amount(e['amount'], e['participant_ids'], e['split_mode'], e['split_values'])
+        assert ledger.to_cents_array(shares).sum() == ledger.to_cents(e['amount'])
+
+def test_mixed_batch_rejects_a_bad_item():
+    with pytest.raises(ValueError):
+        utils._batch_shares([
+            {'amount': 10, 'participant_ids': [1, 2]},
+            {'amount': 10, 'participant_ids': [1, 2], 'split_mode': 'exact', 'split_values': [5, 4]},
+        ])
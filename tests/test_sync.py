@@ -0,0 +1,41 @@
+from benchmarks.fake_supabase import FakeClient
+from benchmarks.synthetic import generate_office
+import utils
+
+def test_truncate_tombstones_reload_every_group_mirror():
+    client = FakeClient(generate_office(10, 50, 3, seed=1))
+    assert len(utils.fetch_history(client)) == 150
+    assert (utils.compute_balances(client)['balance_cents'] != 0).any()
+
+    # TRUNCATE writes one tombstone per table with no group
+    client.truncate('transactions', 'expenses', 'members')
+    utils.invalidate_cache()
+    assert utils.fetch_history(client).empty
+    assert utils.compute_balances(client).empty
+
+def test_deletes_replay_only_in_their_group():
+    data = generate_office(6, 20, 3, seed=2)
+    other = generate_office(6, 20, 3, seed=3, group_id=2)
+    offset = {t: max(r['id'] for r in rows) for t, rows in data.items()}
+    for t, rows in other.items():
+        for r in rows:
+            r['id'] += offset[t]
+            for fk, parent in (('payer_id', 'members'), ('member_id', 'members'), ('expense_id', 'expenses')):
+                if fk in r:
+                    r[fk] += offset[parent]
+        data[t] = data[t] + rows
+    client = FakeClient(data)
+    before = len(utils.fetch_history(client, 2))
+    deleted = utils.delete_expenses(client, [1, 2], group_id=1)
+    assert deleted == [1, 2]
+    assert not set(deleted) & set(utils.fetch_history(client, 1)['expense_id'])
+    assert len(utils.fetch_history(client, 2)) == before
+
+def test_sync_stats_report_watermarks():
+    data = generate_office(5, 40, 2, seed=4)
+    client = FakeClient(data)
+    utils.fetch_history(client)
+    stats = utils.sync_stats(1)
+    assert stats['full_loads'] == 1
+    assert stats['watermarks']['expenses'] == max(e['id'] for e in data['expenses'])
+    assert stats['expenses_created_at'] == max(e['created_at'] for e in data['expenses'])
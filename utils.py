@@ -1,154 +1,881 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import datetime
+import threading
+import time
+from collections import defaultdict
 from decimal import Decimal
 from typing import List, Optional
-from supabase import Client
+from supabase import Client, create_client
+from postgrest.exceptions import APIError
+
+import instrumentation
+import ledger
+import rollups
+import splits
+import sync
+from guest_store import GuestStore
+
+# ---------- Groups ----------
+# Every ledger row belongs to one group (team). All reads and writes below take
+# a group_id and only touch that group's rows; group 1 is the default group
+# that pre-existing data was migrated into.
+DEFAULT_GROUP_ID = 1
 
 # ---------- Guest Mode Initialization ----------
-def init_guest_data():
-    st.session_state.setdefault("guest_members", [])
-    st.session_state.setdefault("guest_expenses", [])
-    st.session_state.setdefault("guest_transactions", [])
+def init_guest_data(group_id: int = DEFAULT_GROUP_ID) -> GuestStore:
+    return st.session_state.setdefault("guest_stores", {}).setdefault(group_id, GuestStore())
+
+def _guest_groups() -> dict:
+    return st.session_state.setdefault("guest_groups", {DEFAULT_GROUP_ID: 'Default'})
+
+# ---------- Client ----------
+@st.cache_resource(show_spinner=False)
+def get_client(url: str, key: str) -> Client:
+    # One client per process: its HTTP session (and keep-alive connections)
+    # is reused by every rerun and session instead of being rebuilt each time.
+    return create_client(url, key)
+
+# ---------- Snapshot Cache ----------
+# Supabase tables are loaded at most once per rerun and reused across reruns
+# until the TTL expires or a write bumps the group's version stamp. Entries
+# are keyed by (group_id, table), so a write only expires its own group.
+SNAPSHOT_TTL_SECONDS = 30.0
+
+_snapshot_lock = threading.Lock()
+_snapshot = {'versions': defaultdict(int), 'tables': {}}
+_snapshot_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+def _peek_cached(group_id: int, table: str):
+    now = time.monotonic()
+    with _snapshot_lock:
+        entry = _snapshot['tables'].get((group_id, table))
+        if (entry is not None and entry['version'] == _snapshot['versions'][group_id]
+                and now - entry['loaded_at'] < SNAPSHOT_TTL_SECONDS):
+            _snapshot_stats['hits'] += 1
+            return entry['rows']
+        _snapshot_stats['misses'] += 1
+        return None
+
+def _store_cached(group_id: int, table: str, version: int, loaded_at: float, rows):
+    with _snapshot_lock:
+        # Don't store rows that a concurrent write has already made stale
+        if version == _snapshot['versions'][group_id]:
+            _snapshot['tables'][(group_id, table)] = {'version': version, 'loaded_at': loaded_at, 'rows': rows}
+
+def invalidate_cache(deleted: bool = False, group_id: Optional[int] = None):
+    # deleted=True after removing rows, for schemas without ledger_tombstones.
+    # group_id=None expires every group.
+    if deleted:
+        for gid, mirror in list(_mirrors.items()):
+            if group_id is None or gid == group_id:
+                mirror.rows_deleted()
+    with _snapshot_lock:
+        if group_id is None:
+            for gid in list(_snapshot['versions']):
+                _snapshot['versions'][gid] += 1
+            _snapshot['tables'].clear()
+        else:
+            _snapshot['versions'][group_id] += 1
+            for key in [k for k in _snapshot['tables'] if k[0] == group_id]:
+                del _snapshot['tables'][key]
+        _snapshot_stats['invalidations'] += 1
+
+def cache_stats() -> dict:
+    with _snapshot_lock:
+        return {**_snapshot_stats, 'versions': dict(_snapshot['versions'])}
+
+# ---------- Column Projection & Dtypes ----------
+# Columns each table read actually uses; nothing selects '*', so wide text
+# (and group_id, which is always the filter) stays on the server unless needed.
+COLUMNS = {
+    'members': 'id,name',
+    'expenses': 'id,title,payer_id,amount,description,created_at',
+    'transactions': 'id,expense_id,member_id,amount',
+    'ledger_tombstones': 'id,table_name,row_id',
+}
+
+def _compact_ids(values) -> np.ndarray:
+    # int32 while every id fits, int64 otherwise
+    ids = np.asarray(values, dtype=np.int64)
+    if ids.size and (ids.max() > np.iinfo(np.int32).max or ids.min() < np.iinfo(np.int32).min):
+        return ids
+    return ids.astype(np.int32)
+
+def _categorical(values) -> pd.Categorical:
+    # Names, titles and descriptions repeat once per participant row
+    return pd.Categorical(values)
+
+def _timestamps(values) -> pd.Series:
+    # ISO strings from Postgres or Guest Mode (naive guest times are taken as UTC)
+    return pd.to_datetime(pd.Series(values, dtype=object), utc=True, format='ISO8601', errors='coerce')
 
 # ---------- Internal Data Access Layer ----------
-def _get_members(supabase: Optional[Client]):
+# Keyset page size for table reads. Keep it at or below the PostgREST
+# max-rows setting (1000 on Supabase) or pages will come back short.
+PAGE_SIZE = 1000
+
+def iter_pages(
+    supabase: Client,
+    table: str,
+    columns: str = '*',
+    page_size: Optional[int] = None,
+    filters=(),
+    after_id: Optional[int] = None,
+):
+    # Pages by primary key (id > last seen, ordered, limited) so reads never hit
+    # the server row cap and never hold more than one page of JSON at a time.
+    # `columns` must include 'id'; `filters` is a sequence of (op, column, value);
+    # `after_id` starts the scan past a known id (for delta reads).
+    page_size = page_size or PAGE_SIZE
+    last_id = after_id
+    while True:
+        query = supabase.table(table).select(columns)
+        for op, column, value in filters:
+            query = getattr(query, op)(column, value)
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        page = query.order('id').limit(page_size).execute().data or []
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last_id = page[-1]['id']
+
+def iter_table(
+    supabase: Client,
+    table: str,
+    columns: str = '*',
+    page_size: Optional[int] = None,
+    filters=(),
+    after_id: Optional[int] = None,
+):
+    for page in iter_pages(supabase, table, columns, page_size, filters, after_id):
+        yield from page
+
+def _in_group(group_id: int, *filters):
+    # iter_pages filters scoping a read to one group
+    return [('eq', 'group_id', group_id), *filters]
+
+def _iter_rows(supabase: Optional[Client], table: str, group_id: int = DEFAULT_GROUP_ID):
+    # Streams a table one page at a time (or from the snapshot when it is
+    # fresh) without keeping it, for full replays that must not hold the table
+    if supabase is None:
+        yield from init_guest_data(group_id).iter_rows(table)
+        return
+    rows = _peek_cached(group_id, table)
+    yield from rows if rows is not None else iter_table(supabase, table, COLUMNS[table], filters=_in_group(group_id))
+
+# ---------- Delta Sync ----------
+# Login Mode reads come from process-wide mirrors of the ledger tables, one
+# per group, refreshed with delta queries (see sync.py) whenever the group's
+# snapshot expires or is invalidated by a write.
+LEDGER_TABLES = sync.TABLES
+_mirrors = {}
+_mirrors_lock = threading.Lock()
+
+def _mirror_for(group_id: int) -> sync.LedgerMirror:
+    with _mirrors_lock:
+        mirror = _mirrors.get(group_id)
+        if mirror is None:
+            def pager(supabase, table, after_id=None):
+                filters = _in_group(group_id)
+                if table == 'ledger_tombstones':
+                    # Truncates are recorded without a group and concern every group
+                    filters = [('or_', f'group_id.eq.{group_id},group_id.is.null', None)]
+                return iter_table(supabase, table, COLUMNS[table], filters=filters, after_id=after_id)
+            mirror = _mirrors[group_id] = sync.LedgerMirror(pager)
+        return mirror
+
+def fetch_tables(supabase: Optional[Client], tables=LEDGER_TABLES, group_id: int = DEFAULT_GROUP_ID) -> dict:
+    # Returns the group's rows for the given tables. Anything missing from the
+    # snapshot triggers one mirror refresh, whose delta reads for all tables
+    # run concurrently, and the refreshed tables become the new snapshot.
     if supabase is None:
-        init_guest_data()
-        return st.session_state.guest_members
-    return supabase.table('members').select('*').execute().data or []
+        store = init_guest_data(group_id)
+        return {t: list(store.iter_rows(t)) for t in tables}
+    result = {}
+    for t in tables:
+        rows = _peek_cached(group_id, t)
+        if rows is not None:
+            result[t] = rows
+    if len(result) < len(tables):
+        with _snapshot_lock:
+            version = _snapshot['versions'][group_id]
+        loaded_at = time.monotonic()
+        mirror = _mirror_for(group_id)
+        mirror.refresh(supabase)
+        for t in LEDGER_TABLES:
+            rows = mirror.table_rows(t)
+            _store_cached(group_id, t, version, loaded_at, rows)
+            if t in tables and t not in result:
+                result[t] = rows
+    return result
+
+def sync_stats(group_id: int = DEFAULT_GROUP_ID) -> dict:
+    mirror = _mirror_for(group_id)
+    return {**mirror.stats, 'watermarks': dict(mirror.watermarks), 'expenses_created_at': mirror.expenses_created_at}
+
+def _get_members(supabase: Optional[Client], group_id: int = DEFAULT_GROUP_ID):
+    return fetch_tables(supabase, ('members',), group_id)['members']
+
+def _members_only(supabase: Client, group_id: int = DEFAULT_GROUP_ID) -> list:
+    # The group's members for name lookups: the snapshot's copy when fresh,
+    # otherwise one members-only read. Unlike _get_members this never
+    # refreshes the mirror, so paged/per-member views don't pull the ledger.
+    rows = _peek_cached(group_id, 'members')
+    if rows is not None:
+        return rows
+    return list(iter_table(supabase, 'members', COLUMNS['members'], filters=_in_group(group_id)))
+
+def _get_expenses(supabase: Optional[Client], group_id: int = DEFAULT_GROUP_ID):
+    return fetch_tables(supabase, ('expenses',), group_id)['expenses']
+
+def _get_transactions(supabase: Optional[Client], group_id: int = DEFAULT_GROUP_ID):
+    return fetch_tables(supabase, ('transactions',), group_id)['transactions']
 
-def _get_expenses(supabase: Optional[Client]):
+# ---------- Group Operations ----------
+def fetch_groups(supabase: Optional[Client]) -> pd.DataFrame:
     if supabase is None:
-        init_guest_data()
-        return st.session_state.guest_expenses
-    return supabase.table('expenses').select('*').execute().data or []
+        rows = [{'id': gid, 'name': name} for gid, name in _guest_groups().items()]
+    else:
+        rows = list(iter_table(supabase, 'groups', 'id,name'))
+    return pd.DataFrame(rows, columns=['id', 'name'])
+
+def create_group(supabase: Optional[Client], name: str):
+    name = name.strip()
+    if not name:
+        return None
 
-def _get_transactions(supabase: Optional[Client]):
     if supabase is None:
-        init_guest_data()
-        return st.session_state.guest_transactions
-    return supabase.table('transactions').select('*').execute().data or []
+        groups = _guest_groups()
+        for gid, existing in groups.items():
+            if existing.lower() == name.lower():
+                return {'id': gid, 'name': existing}
+        gid = max(groups) + 1
+        groups[gid] = name
+        return {'id': gid, 'name': name}
+    existing = supabase.table('groups').select('id,name').eq('name', name).execute().data or []
+    if existing:
+        return existing[0]
+    return supabase.table('groups').insert({'name': name}).execute().data[0]
 
 # ---------- Member Operations ----------
-def fetch_members(supabase: Optional[Client]) -> pd.DataFrame:
-    return pd.DataFrame(_get_members(supabase))
+def _members_frame(rows) -> pd.DataFrame:
+    return pd.DataFrame({
+        'id': _compact_ids([m['id'] for m in rows]),
+        'name': _categorical([m['name'] for m in rows]),
+    }, columns=['id', 'name'])
+
+def fetch_members(supabase: Optional[Client], group_id: int = DEFAULT_GROUP_ID) -> pd.DataFrame:
+    return _members_frame(_get_members(supabase, group_id))
 
-def create_member(supabase: Optional[Client], name: str):
+def create_member(supabase: Optional[Client], name: str, group_id: int = DEFAULT_GROUP_ID):
     name = name.strip()
     if not name:
         return None
 
     if supabase is None:
-        members = _get_members(None)
-        existing = [m for m in members if m['name'].lower() == name.lower()]
-        if existing:
-            return existing[0]
-        new_id = max((m['id'] for m in members), default=0) + 1
-        new_member = {'id': new_id, 'name': name}
-        st.session_state.guest_members.append(new_member)
-        return new_member
+        return init_guest_data(group_id).add_member(name).as_dict()
     else:
-        existing = supabase.table('members').select('*').eq('name', name).execute().data or []
+        existing = supabase.table('members').select(COLUMNS['members']).eq('group_id', group_id).eq('name', name).execute().data or []
         if existing:
             return existing[0]
-        resp = supabase.table('members').insert({'name': name}).execute()
+        resp = supabase.table('members').insert({'name': name, 'group_id': group_id}).execute()
+        invalidate_cache(group_id=group_id)
         return resp.data[0]
 
+def create_members_bulk(supabase: Optional[Client], names: List[str], group_id: int = DEFAULT_GROUP_ID) -> List[dict]:
+    # Inserts names in one request; callers pass only names not already present
+    names = list(dict.fromkeys(n.strip() for n in names if n and n.strip()))
+    if not names:
+        return []
+    if supabase is None:
+        return [create_member(None, n, group_id) for n in names]
+    try:
+        resp = supabase.table('members').insert([{'name': n, 'group_id': group_id} for n in names]).execute()
+    finally:
+        invalidate_cache(group_id=group_id)
+    return resp.data or []
+
 # ---------- Expense Operations ----------
-def _split_amount(amount: Decimal, participant_ids: List[int]):
+# split_mode is one of splits.MODES. split_values has one entry per
+# participant: weights for 'shares', percentages for 'percent', rupee amounts
+# for 'exact' (converted to cents here), nothing for 'equal'.
+def _split_values_cents(split_mode: str, split_values):
+    if split_values is None:
+        return None
+    if split_mode == 'exact':
+        return ledger.to_cents_array(split_values)
+    return np.asarray(split_values, dtype=np.float64)
+
+def _split_amount(
+    amount: Decimal, participant_ids: List[int], split_mode: str = 'equal', split_values=None
+) -> List[float]:
     n = len(participant_ids) if participant_ids else 1
-    base = round(float(amount) / n, 2)
-    shares = [base] * n
-    shares[-1] = round(float(amount) - base * (n - 1), 2)
+    cents = splits.split(ledger.to_cents(amount), n, split_mode, _split_values_cents(split_mode, split_values))
+    return ledger.from_cents(cents).tolist()
+
+def _batch_shares(expenses: List[dict]) -> List[List[float]]:
+    # Shares for a whole batch in one split_batch call; items that bring
+    # precomputed shares keep them
+    shares = [e.get('shares') for e in expenses]
+    todo = [i for i, sh in enumerate(shares) if sh is None]
+    if not todo:
+        return shares
+    counts = [max(len(expenses[i]['participant_ids']), 1) for i in todo]
+    modes = [expenses[i].get('split_mode') or 'equal' for i in todo]
+    values = None
+    if any(m != 'equal' for m in modes):
+        values = np.concatenate([
+            np.zeros(n) if expenses[i].get('split_values') is None
+            else _split_values_cents(m, expenses[i]['split_values']).astype(np.float64)
+            for i, m, n in zip(todo, modes, counts)
+        ])
+    totals = [ledger.to_cents(expenses[i]['amount']) for i in todo]
+    flat = ledger.from_cents(splits.split_batch(totals, counts, modes, values)).tolist()
+    offset = 0
+    for i, n in zip(todo, counts):
+        shares[i] = flat[offset:offset + n]
+        offset += n
     return shares
 
+def _expense_payload(
+    payer_id: int,
+    amount: Decimal,
+    title: str,
+    description: str,
+    participant_ids: List[int],
+    created_at: Optional[str] = None,
+    shares: Optional[List[float]] = None,
+    split_mode: str = 'equal',
+    split_values=None,
+) -> dict:
+    if shares is None:
+        shares = _split_amount(amount, participant_ids, split_mode, split_values)
+    return {
+        'payer_id': payer_id,
+        'amount': float(amount),
+        'title': title,
+        'description': description,
+        'created_at': created_at,
+        'shares': [{'member_id': mid, 'amount': share} for mid, share in zip(participant_ids, shares)],
+    }
+
+def create_expenses_bulk(
+    supabase: Optional[Client], expenses: List[dict], group_id: int = DEFAULT_GROUP_ID
+) -> List[int]:
+    # Each item takes the create_expense_with_transactions keyword arguments,
+    # plus optional created_at and precomputed shares. Shares for the whole
+    # batch are split in one vectorized pass. Login Mode writes the whole batch in one
+    # create_expenses() call, so it either lands completely or not at all.
+    shares = _batch_shares(expenses)
+    payload = [{**_expense_payload(**{**e, 'shares': sh}), 'group_id': group_id} for e, sh in zip(expenses, shares)]
+    if not payload:
+        return []
+
+    if supabase is None:
+        store = init_guest_data(group_id)
+        return [
+            store.add_expense(
+                item['payer_id'], item['amount'], item['title'], item['description'],
+                [(sh['member_id'], sh['amount']) for sh in item['shares']],
+                created_at=item['created_at'],
+            )
+            for item in payload
+        ]
+
+    try:
+        resp = supabase.rpc('create_expenses', {'payload': payload}).execute()
+    finally:
+        invalidate_cache(group_id=group_id)
+    if not resp.data or len(resp.data) != len(payload):
+        raise RuntimeError('Failed to create expenses')
+    return [r['expense_id'] for r in resp.data]
+
 def create_expense_with_transactions(
     supabase: Optional[Client],
     payer_id: int,
     amount: Decimal,
     title: str,
     description: str,
-    participant_ids: List[int]
+    participant_ids: List[int],
+    group_id: int = DEFAULT_GROUP_ID,
+    split_mode: str = 'equal',
+    split_values=None,
 ):
-    shares = _split_amount(amount, participant_ids)
+    return create_expenses_bulk(supabase, [{
+        'payer_id': payer_id,
+        'amount': amount,
+        'title': title,
+        'description': description,
+        'participant_ids': participant_ids,
+        'split_mode': split_mode,
+        'split_values': split_values,
+    }], group_id)[0]
 
+def delete_expenses(
+    supabase: Optional[Client], expense_ids: List[int], group_id: int = DEFAULT_GROUP_ID
+) -> List[int]:
+    # Deletes a set of expenses (and, by cascade, their transactions) in one
+    # delete_expenses() call; returns the ids that existed and were removed
+    expense_ids = list(dict.fromkeys(int(i) for i in expense_ids))
+    if not expense_ids:
+        return []
     if supabase is None:
-        expenses = _get_expenses(None)
-        new_expense_id = max((e['id'] for e in expenses), default=0) + 1
-        st.session_state.guest_expenses.append({
-            'id': new_expense_id,
-            'payer_id': payer_id,
-            'amount': float(amount),
-            'description': description,
-            'created_at': datetime.datetime.now().isoformat(),
-            'title': title,
-        })
-        st.session_state.guest_transactions.extend([
-            {'expense_id': new_expense_id, 'member_id': mid, 'amount': share}
-            for mid, share in zip(participant_ids, shares)
-        ])
-        return new_expense_id
+        store = init_guest_data(group_id)
+        return [i for i in expense_ids if store.delete_expense(i)]
+    try:
+        try:
+            rows = supabase.rpc(
+                'delete_expenses', {'p_group_id': group_id, 'p_expense_ids': expense_ids}
+            ).execute().data or []
+        except APIError:
+            # delete_expenses() not deployed yet: one filtered DELETE, cascading
+            rows = supabase.table('expenses').delete().eq('group_id', group_id).in_('id', expense_ids).execute().data or []
+            rows = [{'expense_id': r['id']} for r in rows]
+    finally:
+        invalidate_cache(deleted=True, group_id=group_id)
+    return [r['expense_id'] for r in rows]
 
-    else:
-        resp = supabase.table('expenses').insert({
-            'payer_id': payer_id,
-            'amount': float(amount),
-            'description': description,
-            'title': title
-        }).execute()
-        if not resp.data:
-            raise RuntimeError('Failed to create expense')
-        expense_id = resp.data[0]['id']
-        rows = [{'expense_id': expense_id, 'member_id': mid, 'amount': share}
-                for mid, share in zip(participant_ids, shares)]
-        supabase.table('transactions').insert(rows).execute()
-        return expense_id
+def delete_expense(supabase: Optional[Client], expense_id: int, group_id: int = DEFAULT_GROUP_ID):
+    delete_expenses(supabase, [expense_id], group_id)
+
+def flush_group(supabase: Optional[Client], group_id: int = DEFAULT_GROUP_ID):
+    # Deletes every member, expense and transaction of one group in a single
+    # flush_group() transaction; other groups are untouched
+    if supabase is None:
+        st.session_state.setdefault("guest_stores", {})[group_id] = GuestStore()
+        return
+    try:
+        try:
+            supabase.rpc('flush_group', {'p_group_id': group_id}).execute()
+        except APIError:
+            # flush_group() not deployed yet
+            for table in ('transactions', 'expenses', 'members'):
+                supabase.table(table).delete().eq('group_id', group_id).execute()
+    finally:
+        invalidate_cache(deleted=True, group_id=group_id)
 
 # ---------- History ----------
-def fetch_history(supabase: Optional[Client]) -> pd.DataFrame:
-    members = {m['id']: m['name'] for m in _get_members(supabase)}
-    expenses = _get_expenses(supabase)
-    transactions = _get_transactions(supabase)
+HISTORY_COLUMNS = [
+    'expense_id', 'date', 'title', 'payer', 'member', 'share', 'total_amount', 'description'
+]
 
-    rows = []
+def _history_columns(members, expenses, transactions) -> dict:
+    # Group transactions by expense once so the join is O(expenses + transactions).
+    # Returns plain column lists in HISTORY_COLUMNS order.
+    names = {m['id']: m['name'] for m in members}
+    by_expense = defaultdict(list)
+    for t in transactions:
+        by_expense[t['expense_id']].append(t)
+
+    cols = {c: [] for c in HISTORY_COLUMNS}
     for e in expenses:
-        e_trans = [t for t in transactions if t['expense_id'] == e['id']]
+        e_trans = by_expense.get(e['id'])
+        if not e_trans:
+            continue
+        payer = names.get(e.get('payer_id'))
         for t in e_trans:
-            rows.append({
-                'expense_id': e['id'],
-                'date': e.get('created_at'),
-                'title': e.get('title'),
-                'payer': members.get(e.get('payer_id')),
-                'member': members.get(t.get('member_id')),
-                'share': t.get('amount'),
-                'total_amount': e.get('amount'),
-                'description': e.get('description')
-            })
-
-    if not rows:
-        return pd.DataFrame(columns=[
-            'expense_id', 'date', 'title', 'payer', 'member', 'share', 'total_amount', 'description'
-        ])
-    return pd.DataFrame(rows)
+            cols['expense_id'].append(e['id'])
+            cols['date'].append(e.get('created_at'))
+            cols['title'].append(e.get('title'))
+            cols['payer'].append(payer)
+            cols['member'].append(names.get(t.get('member_id')))
+            cols['share'].append(t.get('amount'))
+            cols['total_amount'].append(e.get('amount'))
+            cols['description'].append(e.get('description'))
+    return cols
+
+def _history_frame(cols: dict) -> pd.DataFrame:
+    # Compact dtypes: int32 ids, categorical text that repeats per participant
+    # row, UTC datetimes, and amounts rounded through integer cents to float64
+    return pd.DataFrame({
+        'expense_id': _compact_ids(cols['expense_id']),
+        'date': _timestamps(cols['date']).array,
+        'title': _categorical(cols['title']),
+        'payer': _categorical(cols['payer']),
+        'member': _categorical(cols['member']),
+        'share': ledger.from_cents(ledger.to_cents_array(cols['share'])),
+        'total_amount': ledger.from_cents(ledger.to_cents_array(cols['total_amount'])),
+        'description': _categorical(cols['description']),
+    }, columns=HISTORY_COLUMNS)
+
+def _build_history(members, expenses, transactions) -> pd.DataFrame:
+    cols = _history_columns(members, expenses, transactions)
+    if not cols['expense_id']:
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    with instrumentation.stage('fetch_history.dataframe'):
+        return _history_frame(cols)
+
+def fetch_history(supabase: Optional[Client], group_id: int = DEFAULT_GROUP_ID) -> pd.DataFrame:
+    with instrumentation.stage('fetch_history'):
+        tables = fetch_tables(supabase, group_id=group_id)
+        return _build_history(tables['members'], tables['expenses'], tables['transactions'])
+
+# Expenses per History page. The page's transactions are fetched with one
+# expense_id IN (...) filter, so keep this small enough for a URL.
+HISTORY_PAGE_SIZE = 25
+
+def _history_filters(start, end, payer_id, member_id, search):
+    # PostgREST filters on expenses; member_id filters through the embedded
+    # transactions!inner(...) resource, i.e. expenses the member took part in
+    filters = []
+    if start is not None:
+        filters.append(('gte', 'created_at', start.isoformat()))
+    if end is not None:
+        filters.append(('lt', 'created_at', (end + datetime.timedelta(days=1)).isoformat()))
+    if payer_id is not None:
+        filters.append(('eq', 'payer_id', payer_id))
+    if member_id is not None:
+        filters.append(('eq', 'transactions.member_id', member_id))
+    if search:
+        filters.append(('ilike', 'title', f'%{search}%'))
+    return filters
+
+def _guest_history_page(store, offset, limit, start, end, payer_id, member_id, search):
+    start_s = start.isoformat() if start else None
+    end_s = end.isoformat() if end else None
+    needle = search.lower() if search else None
+    matched = []
+    for e in reversed(list(store.expenses.values())):
+        day = (e.created_at or '')[:10]
+        if (start_s is not None and day < start_s) or (end_s is not None and day > end_s):
+            continue
+        if payer_id is not None and e.payer_id != payer_id:
+            continue
+        if needle is not None and needle not in (e.title or '').lower():
+            continue
+        if member_id is not None and not any(t.member_id == member_id for t in store.transactions_for(e.id)):
+            continue
+        matched.append(e)
+    page = matched[offset:offset + limit]
+    transactions = [t.as_dict() for e in page for t in store.transactions_for(e.id)]
+    return [e.as_dict() for e in page], transactions, len(matched)
+
+def fetch_history_page(
+    supabase: Optional[Client],
+    page: int = 0,
+    page_size: int = HISTORY_PAGE_SIZE,
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+    payer_id: Optional[int] = None,
+    member_id: Optional[int] = None,
+    search: Optional[str] = None,
+    group_id: int = DEFAULT_GROUP_ID,
+):
+    # One page of the group's history, newest expense first, filtered and
+    # paginated on the server. Returns (rows in HISTORY_COLUMNS for the page's
+    # expenses, number of matching expenses).
+    with instrumentation.stage('fetch_history_page'):
+        offset = max(page, 0) * page_size
+        if supabase is None:
+            store = init_guest_data(group_id)
+            members = list(store.iter_rows('members'))
+            expenses, transactions, total = _guest_history_page(
+                store, offset, page_size, start, end, payer_id, member_id, search
+            )
+            return _build_history(members, expenses, transactions), total
+
+        members = _members_only(supabase, group_id)
+        columns = 'id,title,payer_id,amount,description,created_at'
+        if member_id is not None:
+            columns += ',transactions!inner(member_id)'
+        query = supabase.table('expenses').select(columns, count='exact')
+        for op, column, value in _in_group(group_id, *_history_filters(start, end, payer_id, member_id, search)):
+            query = getattr(query, op)(column, value)
+        resp = query.order('id', desc=True).range(offset, offset + page_size - 1).execute()
+        expenses = resp.data or []
+        total = resp.count if resp.count is not None else len(expenses)
+        transactions = []
+        if expenses:
+            transactions = list(iter_table(
+                supabase, 'transactions', 'id,expense_id,member_id,amount',
+                filters=_in_group(group_id, ('in_', 'expense_id', [e['id'] for e in expenses])),
+            ))
+        return _build_history(members, expenses, transactions), total
 
 # ---------- Balances ----------
-def compute_balances(supabase: Optional[Client]) -> pd.DataFrame:
-    members = _get_members(supabase)
-    expenses = _get_expenses(supabase)
-    transactions = _get_transactions(supabase)
+def _balances_frame(member_ids, names, cents) -> pd.DataFrame:
+    cents = np.asarray(cents, dtype=np.int64)
+    return pd.DataFrame({
+        'member_id': _compact_ids(list(member_ids)),
+        'name': _categorical(list(names)),
+        'balance': ledger.from_cents(cents),
+        'balance_cents': cents,
+    }, columns=['member_id', 'name', 'balance', 'balance_cents'])
 
-    balances = {m['id']: 0.0 for m in members}
-    for e in expenses:
-        balances[e['payer_id']] += float(e['amount'])
-    for t in transactions:
-        balances[t['member_id']] -= float(t['amount'])
+def _compute_balances_local(members, expenses, transactions) -> pd.DataFrame:
+    book = ledger.Ledger([m['id'] for m in members])
+    book.add_expenses(expenses)
+    book.add_transactions(transactions)
+    return _balances_frame(book.member_ids.tolist(), [m['name'] for m in members], book.balances)
 
-    return pd.DataFrame([
-        {
-            'member_id': mid,
-            'name': next((m['name'] for m in members if m['id'] == mid), 'n/a'),
-            'balance': round(bal, 2)
+def _compute_balances_rpc(supabase: Client, group_id: int) -> pd.DataFrame:
+    rows = supabase.rpc('get_member_balances', {'p_group_id': group_id}).execute().data or []
+    return _balances_frame(
+        [r['member_id'] for r in rows],
+        [r['name'] for r in rows],
+        ledger.to_cents_array([r['balance'] for r in rows]),
+    )
+
+def _compute_balances_mirror(supabase: Client, group_id: int) -> pd.DataFrame:
+    members = fetch_tables(supabase, ('members',), group_id)['members']
+    mirror = _mirror_for(group_id)
+    return _balances_frame(
+        [m['id'] for m in members],
+        [m['name'] for m in members],
+        [mirror.balance_of(m['id']) for m in members],
+    )
+
+# ---------- Balance Checkpoints ----------
+# balance_snapshots holds every member's balance as of one expense id, so a
+# fresh process can read the latest checkpoint plus only the newer rows
+# instead of replaying the whole ledger. Deleting a covered expense drops the
+# affected checkpoints (trigger in supabase_schema.sql).
+def create_balance_checkpoint(supabase: Optional[Client], group_id: int = DEFAULT_GROUP_ID) -> Optional[int]:
+    # Returns the expense id the new checkpoint covers. Guest Mode keeps
+    # running balances already, so there is nothing to checkpoint.
+    if supabase is None:
+        return None
+    return supabase.rpc('create_balance_snapshot', {'p_group_id': group_id}).execute().data
+
+def _latest_checkpoint(supabase: Client, group_id: int):
+    # (as_of_expense_id, {member_id: cents}) or (0, {}) when there is none
+    latest = (
+        supabase.table('balance_snapshots')
+        .select('as_of_expense_id')
+        .eq('group_id', group_id)
+        .order('as_of_expense_id', desc=True)
+        .limit(1)
+        .execute()
+        .data
+    )
+    if not latest:
+        return 0, {}
+    cutoff = latest[0]['as_of_expense_id']
+    rows = list(iter_table(
+        supabase, 'balance_snapshots', 'id,member_id,balance',
+        filters=_in_group(group_id, ('eq', 'as_of_expense_id', cutoff)),
+    ))
+    cents = ledger.to_cents_array([r['balance'] for r in rows]).tolist()
+    return cutoff, dict(zip((r['member_id'] for r in rows), cents))
+
+def _compute_balances_checkpoint(supabase: Client, group_id: int) -> pd.DataFrame:
+    cutoff, opening = _latest_checkpoint(supabase, group_id)
+    members = list(iter_table(supabase, 'members', 'id,name', filters=_in_group(group_id)))
+    book = ledger.Ledger([m['id'] for m in members])
+    if opening:
+        known = set(book.member_ids.tolist())
+        ids = [mid for mid in opening if mid in known]
+        book.credit(ids, [opening[mid] for mid in ids])
+    book.add_expenses(iter_table(
+        supabase, 'expenses', 'id,payer_id,amount', filters=_in_group(group_id), after_id=cutoff or None
+    ))
+    book.add_transactions(iter_table(
+        supabase, 'transactions', 'id,member_id,amount', filters=_in_group(group_id, ('gt', 'expense_id', cutoff))
+    ))
+    return _balances_frame(book.member_ids.tolist(), [m['name'] for m in members], book.balances)
+
+def verify_checkpoint(supabase: Optional[Client], group_id: int = DEFAULT_GROUP_ID) -> dict:
+    # Checks checkpoint + tail against a full replay of the ledger. Returns
+    # {'as_of_expense_id', 'ok', 'mismatches': DataFrame(member_id, name,
+    # checkpoint, replay)}.
+    if supabase is None:
+        empty = pd.DataFrame(columns=['member_id', 'name', 'checkpoint', 'replay'])
+        return {'as_of_expense_id': None, 'ok': True, 'mismatches': empty}
+    cutoff, _ = _latest_checkpoint(supabase, group_id)
+    fast = _compute_balances_checkpoint(supabase, group_id)
+    full = _compute_balances_local(
+        list(iter_table(supabase, 'members', 'id,name', filters=_in_group(group_id))),
+        iter_table(supabase, 'expenses', 'id,payer_id,amount', filters=_in_group(group_id)),
+        iter_table(supabase, 'transactions', 'id,member_id,amount', filters=_in_group(group_id)),
+    )
+    merged = fast.merge(full, on=['member_id', 'name'], how='outer', suffixes=('_checkpoint', '_replay'))
+    diff = merged[merged['balance_cents_checkpoint'].fillna(0) != merged['balance_cents_replay'].fillna(0)]
+    mismatches = pd.DataFrame({
+        'member_id': diff['member_id'],
+        'name': diff['name'],
+        'checkpoint': diff['balance_checkpoint'],
+        'replay': diff['balance_replay'],
+    }).reset_index(drop=True)
+    return {'as_of_expense_id': cutoff, 'ok': mismatches.empty, 'mismatches': mismatches}
+
+# 'mirror' reads the balance vector maintained by the delta sync; 'rpc' asks
+# Postgres (get_member_balances) and suits processes that don't need history;
+# 'checkpoint' reads the latest balance_snapshots row set plus the tail
+BALANCE_SOURCE = 'mirror'
+
+def compute_balances(
+    supabase: Optional[Client], source: Optional[str] = None, group_id: int = DEFAULT_GROUP_ID
+) -> pd.DataFrame:
+    with instrumentation.stage('compute_balances'):
+        return _compute_balances(supabase, source or BALANCE_SOURCE, group_id)
+
+def _compute_balances(supabase: Optional[Client], source: str, group_id: int) -> pd.DataFrame:
+    if supabase is None:
+        # The guest store keeps balances up to date on every write
+        store = init_guest_data(group_id)
+        return _balances_frame(
+            list(store.members),
+            [m.name for m in store.members.values()],
+            [store.balances[mid] for mid in store.members],
+        )
+    if source == 'rpc':
+        try:
+            return _compute_balances_rpc(supabase, group_id)
+        except APIError:
+            # get_member_balances() not deployed yet
+            pass
+    elif source == 'checkpoint':
+        try:
+            return _compute_balances_checkpoint(supabase, group_id)
+        except APIError:
+            # balance_snapshots not deployed yet
+            pass
+    return _compute_balances_mirror(supabase, group_id)
+
+# ---------- Member Statement ----------
+# "Why do I owe ₹X?": one member's lines (expenses they paid for or share in),
+# oldest first, with the running balance after each line. Reads only that
+# member's rows: the member_statement() RPC in Login Mode (window function over
+# the member indexes), the member -> expenses index in Guest Mode.
+STATEMENT_COLUMNS = ['expense_id', 'date', 'title', 'payer', 'paid', 'owed', 'balance']
+
+# Expense ids per IN (...) filter when the RPC is missing, to keep URLs short
+STATEMENT_ID_CHUNK = 100
+
+def _statement_frame(names, expense_ids, dates, titles, payer_ids, paid_cents, owed_cents, balance_cents) -> pd.DataFrame:
+    return pd.DataFrame({
+        'expense_id': _compact_ids(list(expense_ids)),
+        'date': _timestamps(list(dates)).array,
+        'title': _categorical(list(titles)),
+        'payer': _categorical([names.get(pid) for pid in payer_ids]),
+        'paid': ledger.from_cents(np.asarray(paid_cents, dtype=np.int64)),
+        'owed': ledger.from_cents(np.asarray(owed_cents, dtype=np.int64)),
+        'balance': ledger.from_cents(np.asarray(balance_cents, dtype=np.int64)),
+    }, columns=STATEMENT_COLUMNS)
+
+def _statement_local(names, member_id, expenses, owed, start, end) -> pd.DataFrame:
+    # `expenses` are the member's expense rows, `owed` maps expense id -> cents
+    # they owe on it. Running balance over all lines, then the date window.
+    expenses = list(expenses)
+    ids = np.asarray([e['id'] for e in expenses], dtype=np.int64)
+    dates = _timestamps([e['created_at'] for e in expenses])
+    paid = np.asarray(
+        [ledger.to_cents(e['amount']) if e['payer_id'] == member_id else 0 for e in expenses], dtype=np.int64
+    )
+    owes = np.asarray([owed.get(e['id'], 0) for e in expenses], dtype=np.int64)
+    order = np.lexsort((ids, dates.to_numpy()))
+    running = np.cumsum(paid[order] - owes[order])
+
+    keep = np.ones(len(order), dtype=bool)
+    when = dates.iloc[order]
+    if start is not None:
+        keep &= (when >= pd.Timestamp(start, tz='UTC')).to_numpy()
+    if end is not None:
+        keep &= (when < pd.Timestamp(end + datetime.timedelta(days=1), tz='UTC')).to_numpy()
+    rows = order[keep]
+    return _statement_frame(
+        names, ids[rows], [expenses[i]['created_at'] for i in rows], [expenses[i]['title'] for i in rows],
+        [expenses[i]['payer_id'] for i in rows], paid[rows], owes[rows], running[keep],
+    )
+
+def _statement_rows(supabase: Client, member_id: int, group_id: int):
+    # member_statement() not deployed: the member's paid expenses and owed
+    # shares through the same indexes, then the expenses behind those shares
+    columns = 'id,title,payer_id,amount,created_at'
+    expenses = list(iter_table(supabase, 'expenses', columns, filters=_in_group(group_id, ('eq', 'payer_id', member_id))))
+    owed = defaultdict(int)
+    for t in iter_table(supabase, 'transactions', 'id,expense_id,amount', filters=_in_group(group_id, ('eq', 'member_id', member_id))):
+        owed[t['expense_id']] += ledger.to_cents(t['amount'])
+    known = {e['id'] for e in expenses}
+    missing = [eid for eid in owed if eid not in known]
+    for i in range(0, len(missing), STATEMENT_ID_CHUNK):
+        chunk = missing[i:i + STATEMENT_ID_CHUNK]
+        expenses.extend(iter_table(supabase, 'expenses', columns, filters=_in_group(group_id, ('in_', 'id', chunk))))
+    return expenses, owed
+
+def fetch_member_statement(
+    supabase: Optional[Client],
+    member_id: int,
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+    group_id: int = DEFAULT_GROUP_ID,
+) -> pd.DataFrame:
+    # Lines dated start..end (inclusive days, UTC) in STATEMENT_COLUMNS. The
+    # balance column includes everything before `start`, so the last line's
+    # balance is the member's balance at `end`.
+    with instrumentation.stage('fetch_member_statement'):
+        if supabase is None:
+            store = init_guest_data(group_id)
+            names = {mid: m.name for mid, m in store.members.items()}
+            expenses = store.expenses_of(member_id)
+            owed = {
+                e.id: sum(ledger.to_cents(t.amount) for t in store.transactions_for(e.id) if t.member_id == member_id)
+                for e in expenses
+            }
+            return _statement_local(names, member_id, [e.as_dict() for e in expenses], owed, start, end)
+
+        names = {m['id']: m['name'] for m in _members_only(supabase, group_id)}
+        params = {
+            'p_group_id': group_id,
+            'p_member_id': member_id,
+            'p_start': start.isoformat() if start is not None else None,
+            'p_end': (end + datetime.timedelta(days=1)).isoformat() if end is not None else None,
         }
-        for mid, bal in balances.items()
-    ]).reset_index(drop=True)
+        try:
+            rows = supabase.rpc('member_statement', params).execute().data or []
+        except APIError:
+            expenses, owed = _statement_rows(supabase, member_id, group_id)
+            return _statement_local(names, member_id, expenses, owed, start, end)
+        return _statement_frame(
+            names,
+            [r['expense_id'] for r in rows],
+            [r['created_at'] for r in rows],
+            [r['title'] for r in rows],
+            [r['payer_id'] for r in rows],
+            ledger.to_cents_array([r['paid'] for r in rows]),
+            ledger.to_cents_array([r['owed'] for r in rows]),
+            ledger.to_cents_array([r['running_balance'] for r in rows]),
+        )
+
+# ---------- Spending Rollups ----------
+# Analytics read only pre-aggregated rows: per (month, member) and per
+# (month, title), kept current by the rollup triggers in supabase_schema.sql
+# (Login Mode) or incrementally by the guest store, so the cost follows the
+# number of months and members, not the length of the history.
+def _rollup_rows(supabase: Client, table: str, columns: str, amounts, group_id: int):
+    # Rollup rows with 'YYYY-MM' months and the `amounts` columns in cents
+    rows = list(iter_table(supabase, table, columns, filters=_in_group(group_id)))
+    for column in amounts:
+        for r, cents in zip(rows, ledger.to_cents_array([r[column] for r in rows]).tolist()):
+            r[column] = cents
+    for r in rows:
+        r['month'] = rollups.month_of(r['month'])
+    return rows
+
+def fetch_rollups(supabase: Optional[Client], group_id: int = DEFAULT_GROUP_ID) -> dict:
+    # {'members': month, member_id, paid, owed, paid_count, shared_count, name;
+    #  'titles': month, title, amount, expenses}. Months are 'YYYY-MM'.
+    with instrumentation.stage('fetch_rollups'):
+        if supabase is None:
+            store = init_guest_data(group_id)
+            names = {mid: m.name for mid, m in store.members.items()}
+            member_rows, title_rows = store.rollups.member_rows(), store.rollups.title_rows()
+        else:
+            names = {m['id']: m['name'] for m in _members_only(supabase, group_id)}
+            try:
+                member_rows = _rollup_rows(
+                    supabase, 'spending_rollups', 'id,month,member_id,paid,owed,paid_count,shared_count',
+                    ('paid', 'owed'), group_id,
+                )
+                title_rows = _rollup_rows(supabase, 'title_rollups', 'id,month,title,amount,expenses', ('amount',), group_id)
+            except APIError:
+                # rollup tables not deployed yet: aggregate the mirrored ledger
+                tables = fetch_tables(supabase, ('expenses', 'transactions'), group_id)
+                agg = rollups.SpendingRollups()
+                agg.add_rows(tables['expenses'], tables['transactions'])
+                member_rows, title_rows = agg.member_rows(), agg.title_rows()
+        return {'members': rollups.member_frame(member_rows, names), 'titles': rollups.title_frame(title_rows)}
@@ -2,6 +2,10 @@ from supabase import Client
 import pandas as pd
 from decimal import Decimal
 from typing import List, Dict
+from collections import defaultdict
+
+import ledger
+import splits
 
 def fetch_members(supabase: Client) -> pd.DataFrame:
     resp = supabase.table('members').select('*').execute()
@@ -29,15 +33,11 @@ def create_expense_with_transactions(supabase: Client, payer_id: int, amount: De
         raise RuntimeError('failed to create expense')
     expense_id = resp.data[0]['id']
 
-    # create transactions: split equally among participants
+    # create transactions: split equally among participants (same engine as utils)
     n = len(participant_ids) if participant_ids else 1
-    base = round(float(amount) / n, 2)
+    shares = ledger.from_cents(splits.split(ledger.to_cents(amount), n)).tolist()
     rows = []
-    for i, mid in enumerate(participant_ids):
-        share = base
-        if i == n - 1:
-            # adjust last share to match total
-            share = round(float(amount) - base*(n-1), 2)
+    for mid, share in zip(participant_ids, shares):
         rows.append({'expense_id': expense_id, 'member_id': mid, 'amount': share})
     supabase.table('transactions').insert(rows).execute()
     return expense_id
@@ -46,10 +46,14 @@ def fetch_history(supabase: Client):
     expenses = supabase.table('expenses').select('*').execute().data or []
     transactions = supabase.table('transactions').select('*').execute().data or []
     members = {m['id']: m['name'] for m in (supabase.table('members').select('*').execute().data or [])}
+    by_expense = defaultdict(list)
+    for t in transactions:
+        by_expense[t['expense_id']].append(t)
+
     rows = []
     for e in expenses:
         e_id = e['id']
-        e_trans = [t for t in transactions if t['expense_id'] == e_id]
+        e_trans = by_expense.get(e_id, [])
         for t in e_trans:
             rows.append({
                 'expense_id': e_id,